@@ -0,0 +1,68 @@
+# ----------------------------------------------------------------------------#
+# Recent activity.
+#
+# The home page lists the latest venues, artists and shows. They are kept
+# in one bounded ring buffer (a deque with maxlen) per kind: the create
+# handlers push new items, the oldest fall off, and reading the feed does
+# not touch the database. The buffers are filled from the database once,
+# on first use, and again after deletes and bulk loads clear them.
+# ----------------------------------------------------------------------------#
+
+import threading
+from collections import deque
+
+KINDS = ('venue', 'artist', 'show')
+
+
+class RecentActivity:
+    """Latest items of every kind, newest first.
+
+    Parameters:
+        -loader (function): loader(kind, size) returns the `size` latest
+                            items of kind as dicts, newest first
+        -size (int): items kept per kind
+    """
+
+    def __init__(self, loader, size=10):
+        self.loader = loader
+        self.size = size
+        self.buffers = None
+        self.lock = threading.Lock()
+
+    def _load(self):
+        buffers = {kind: deque(self.loader(kind, self.size), maxlen=self.size) for kind in KINDS}
+        with self.lock:
+            if self.buffers is None:
+                self.buffers = buffers
+            return self.buffers
+
+    def latest(self):
+        """{'venue': [...], 'artist': [...], 'show': [...]}, newest first"""
+        with self.lock:
+            buffers = self.buffers
+        if buffers is None:
+            buffers = self._load()
+        with self.lock:
+            return {kind: [dict(item) for item in buffer] for kind, buffer in buffers.items()}
+
+    def record(self, kind, item):
+        """Push a new item; a no-op until the buffers are loaded, which will include it"""
+        with self.lock:
+            if self.buffers is not None:
+                self.buffers[kind].appendleft(item)
+
+    def update(self, kind, entity_id, **fields):
+        """Change fields (e.g. a renamed venue) of the items of an entity and of its shows"""
+        with self.lock:
+            if self.buffers is None:
+                return
+            for item in self.buffers[kind]:
+                if item['id'] == entity_id:
+                    item.update(fields)
+            for item in self.buffers['show']:
+                if item[kind + '_id'] == entity_id:
+                    item.update({kind + '_' + name: value for name, value in fields.items()})
+
+    def clear(self):
+        with self.lock:
+            self.buffers = None
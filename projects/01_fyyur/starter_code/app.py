@@ -2,21 +2,43 @@
 # Imports
 # ----------------------------------------------------------------------------#
 
+import hashlib
 import logging
 import json
+from functools import lru_cache, wraps
+from itertools import groupby
+import sqlite3
 import sys
+import threading
+import time
 import babel
+import babel.dates
+import click
 import dateutil.parser
-from datetime import datetime
+from datetime import datetime, timedelta
 from logging import Formatter, FileHandler
-from flask import Flask, render_template, request, flash, redirect, url_for, jsonify, Response
+from flask import Flask, render_template, request, flash, redirect, url_for, jsonify, Response, abort, \
+    stream_with_context, session
 from flask_migrate import Migrate
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import ARRAY, ExcludeConstraint
 from forms import *
+from search import NgramIndex
+from cache import make_cache
+from bulk_import import ImportReport, import_rows, read_rows
+from availability import AvailabilityIndex, parse_naive
+from matchmaking import MatchIndex
+from activity import RecentActivity
+from request_log import init_request_timing, json_lines_handler, start_queue_logging
+from db_routing import RoutingSession, init_read_your_writes, read_only, use_primary
+import benchmark
+from static_assets import build_assets, init_static_assets
 from flask_wtf import Form
-from sqlalchemy import and_, or_, not_
+from sqlalchemy import and_, or_, not_, func, literal, select, union_all, case, event, text, DDL
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm.exc import StaleDataError
 
 # ----------------------------------------------------------------------------#
 # App Config.
@@ -25,8 +47,20 @@ from sqlalchemy import and_, or_, not_
 app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
-db = SQLAlchemy(app)
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
 migrate = Migrate(app, db)
+init_read_your_writes(app)
+page_cache = make_cache(app.config)
+init_static_assets(app)
+
+
+@event.listens_for(Engine, 'connect')
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite only honours ON DELETE CASCADE with foreign keys switched on
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
 
 
 # ----------------------------------------------------------------------------#
@@ -35,6 +69,15 @@ migrate = Migrate(app, db)
 
 class Venue(db.Model):
     __tablename__ = 'venues'
+    __table_args__ = (
+        db.Index('ix_venues_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_venues_city_trgm', 'city', postgresql_using='gin',
+                 postgresql_ops={'city': 'gin_trgm_ops'}),
+        db.Index('ix_venues_state_trgm', 'state', postgresql_using='gin',
+                 postgresql_ops={'state': 'gin_trgm_ops'}),
+        db.Index('ix_venues_genres', 'genres', postgresql_using='gin'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
@@ -48,13 +91,28 @@ class Venue(db.Model):
     facebook_link = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(500))
-    shows = db.relationship('Show', cascade="all,delete-orphan", backref='venue', lazy=True)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    # shows are removed by the ON DELETE CASCADE foreign key, never loaded for it
+    shows = db.relationship('Show', cascade="all,delete-orphan", backref='venue', lazy=True,
+                            passive_deletes=True)
+
+    # bumped by every ORM update, used as the ETag of the API resources
+    __mapper_args__ = {'version_id_col': version}
 
     def __repr__(self):
         return self.name
 
 class Artist(db.Model):
     __tablename__ = 'artists'
+    __table_args__ = (
+        db.Index('ix_artists_name_trgm', 'name', postgresql_using='gin',
+                 postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_artists_city_trgm', 'city', postgresql_using='gin',
+                 postgresql_ops={'city': 'gin_trgm_ops'}),
+        db.Index('ix_artists_state_trgm', 'state', postgresql_using='gin',
+                 postgresql_ops={'state': 'gin_trgm_ops'}),
+        db.Index('ix_artists_genres', 'genres', postgresql_using='gin'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String, nullable=False)
@@ -67,14 +125,31 @@ class Artist(db.Model):
     facebook_link = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, default=False)
     seeking_description = db.Column(db.String(500))
-    shows = db.relationship('Show', cascade="all, delete-orphan", backref='artist', lazy=True)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    shows = db.relationship('Show', cascade="all, delete-orphan", backref='artist', lazy=True,
+                            passive_deletes=True)
+
+    __mapper_args__ = {'version_id_col': version}
 
     def __repr__(self):
         return self.name
 
 
+# [start_time, start_time + duration) of a show, for the exclusion constraints
+SHOW_PERIOD = "tsrange(start_time, start_time + interval '{} hours')".format(app.config.get('SHOW_DURATION_HOURS', 3))
+
+
 class Show(db.Model):
     __tablename__ = 'shows'
+    __table_args__ = (
+        db.Index('ix_shows_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_shows_artist_id_start_time', 'artist_id', 'start_time'),
+        # no two shows of a venue, or of an artist, overlap (migration 7b0d3f86e1a2)
+        ExcludeConstraint(('venue_id', '='), (text(SHOW_PERIOD), '&&'),
+                          name='shows_venue_id_no_overlap', using='gist').ddl_if(dialect='postgresql'),
+        ExcludeConstraint(('artist_id', '='), (text(SHOW_PERIOD), '&&'),
+                          name='shows_artist_id_no_overlap', using='gist').ddl_if(dialect='postgresql'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     artist_id = db.Column(db.Integer, db.ForeignKey('artists.id', ondelete='CASCADE'), nullable=False)
     venue_id = db.Column(db.Integer, db.ForeignKey('venues.id', ondelete='CASCADE'), nullable=False)
@@ -84,17 +159,691 @@ class Show(db.Model):
         return '<Show {}{}>'.format(self.artist_id, self.venue_id)
 
 
+# btree_gist provides the "=" operator class for integers in a GiST index
+event.listen(Show.__table__, 'before_create',
+             DDL('CREATE EXTENSION IF NOT EXISTS btree_gist').execute_if(dialect='postgresql'))
+
+
+class VenueShowStats(db.Model):
+    """Show counters of a venue, kept up to date on show insert/delete"""
+    __tablename__ = 'venue_show_stats'
+    venue_id = db.Column(db.Integer, db.ForeignKey('venues.id', ondelete='CASCADE'), primary_key=True)
+    total_shows = db.Column(db.Integer, nullable=False, default=0, index=True)
+    upcoming_shows = db.Column(db.Integer, nullable=False, default=0)
+    next_show_at = db.Column(db.DateTime, index=True)
+    last_show_at = db.Column(db.DateTime)
+
+
+class ArtistShowStats(db.Model):
+    """Show counters of an artist, kept up to date on show insert/delete"""
+    __tablename__ = 'artist_show_stats'
+    artist_id = db.Column(db.Integer, db.ForeignKey('artists.id', ondelete='CASCADE'), primary_key=True)
+    total_shows = db.Column(db.Integer, nullable=False, default=0, index=True)
+    upcoming_shows = db.Column(db.Integer, nullable=False, default=0)
+    next_show_at = db.Column(db.DateTime, index=True)
+    last_show_at = db.Column(db.DateTime)
+
+
+# ----------------------------------------------------------------------------#
+# Queries.
+# ----------------------------------------------------------------------------#
+
+# Show column that points at each side of the venue/artist relation
+SHOW_KEYS = {
+    Venue: Show.venue_id,
+    Artist: Show.artist_id,
+}
+
+# Counter table of each side, and its key column
+SHOW_STATS = {
+    Venue: (VenueShowStats, VenueShowStats.venue_id),
+    Artist: (ArtistShowStats, ArtistShowStats.artist_id),
+}
+
+# ?sort= options of the listing pages, backed by the show counters
+STATS_SORTS = {
+    'busiest': lambda stats: stats.total_shows.desc().nulls_last(),
+    'next_show': lambda stats: stats.next_show_at.asc().nulls_last(),
+}
+
+
+def load_show_timeline(model, counterpart, entity_id):
+    """Load a venue or artist and the other side of its shows in one query.
+
+    Shows are split into past and upcoming in SQL against a single "now",
+    and the size of each bucket is counted by the database.
+
+    Parameters:
+        -model: Venue or Artist, the entity being displayed
+        -counterpart: the model on the other side of Show (Artist or Venue)
+        -entity_id (int): id of the entity
+
+    Returns:
+        -tuple: (entity, past_shows, upcoming_shows, past_count, upcoming_count),
+                entity is None if no such row exists
+    """
+    own_key = SHOW_KEYS[model]
+    other_key = SHOW_KEYS[counterpart]
+    prefix = counterpart.__name__.lower()
+    now = datetime.now()
+    is_past = Show.start_time < now
+
+    rows = db.session.query(
+        model,
+        counterpart.id,
+        counterpart.name,
+        counterpart.image_link,
+        Show.start_time,
+        is_past.label('is_past'),
+        func.count(Show.id).over(partition_by=is_past).label('bucket_count')
+    ).outerjoin(Show, own_key == model.id) \
+        .outerjoin(counterpart, other_key == counterpart.id) \
+        .filter(model.id == entity_id) \
+        .order_by(Show.start_time).all()
+
+    if not rows:
+        return None, [], [], 0, 0
+
+    entity = rows[0][0]
+    past_shows, upcoming_shows = [], []
+    counts = {True: 0, False: 0}
+    for _, other_id, other_name, other_image, start_time, past, bucket_count in rows:
+        if start_time is None:  # entity without any show (outer join)
+            continue
+        counts[bool(past)] = bucket_count
+        (past_shows if past else upcoming_shows).append({
+            prefix + '_id': other_id,
+            prefix + '_name': other_name,
+            prefix + '_image_link': other_image,
+            'start_time': start_time
+        })
+
+    return entity, past_shows, upcoming_shows, counts[True], counts[False]
+
+
+def genre_filter(model, genres):
+    """Array containment (genres @> ARRAY[...]) answered by the GIN index on genres"""
+    return model.genres.contains(genres)
+
+
+def load_venue_areas(per_area=None, city=None, state=None, page=1, genres=None, sort=None):
+    """Group venues by (city, state) from a single ordered query.
+
+    Parameters:
+        -per_area (int): max venues listed per area, None lists them all
+        -city, state (str): restrict the listing to one area ("show more")
+        -page (int): page of the area listing, only used with per_area
+        -genres (list): only list venues having all of these genres
+        -sort (str): a STATS_SORTS key to order venues within an area, default by id
+
+    Returns:
+        -list: one dict per area with its venues, total and next page (or None)
+    """
+    area = (Venue.city, Venue.state)
+    order = (Venue.id,)
+    if sort in STATS_SORTS:
+        order = (STATS_SORTS[sort](VenueShowStats), Venue.id)
+    rank = func.row_number().over(partition_by=area, order_by=order).label('rank')
+    total = func.count(Venue.id).over(partition_by=area).label('area_total')
+    ranked = db.session.query(Venue.id, Venue.name, Venue.city, Venue.state, rank, total)
+    if sort in STATS_SORTS:
+        ranked = ranked.outerjoin(VenueShowStats, VenueShowStats.venue_id == Venue.id)
+    if city is not None and state is not None:
+        ranked = ranked.filter(Venue.city == city, Venue.state == state)
+    if genres:
+        ranked = ranked.filter(genre_filter(Venue, genres))
+    ranked = ranked.subquery()
+
+    query = db.session.query(ranked)
+    offset = 0
+    if per_area:
+        offset = (page - 1) * per_area
+        query = query.filter(ranked.c.rank > offset, ranked.c.rank <= offset + per_area)
+    rows = query.order_by(ranked.c.city, ranked.c.state, ranked.c.rank)
+
+    areas = []
+    for (area_city, area_state), venues in groupby(rows, key=lambda row: (row.city, row.state)):
+        venues = list(venues)
+        area_total = venues[0].area_total
+        has_more = per_area and offset + len(venues) < area_total
+        areas.append({
+            'city': area_city,
+            'state': area_state,
+            'venues': venues,
+            'total': area_total,
+            'next_page': page + 1 if has_more else None
+        })
+    return areas
+
+
+def encode_show_cursor(start_time, show_id):
+    """Opaque keyset cursor for the /shows feed"""
+    return '{}_{}'.format(start_time.isoformat(), show_id)
+
+
+def decode_show_cursor(cursor):
+    """Inverse of encode_show_cursor, returns None for a missing or bad cursor"""
+    try:
+        start_time, show_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(start_time), int(show_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def query_show_feed(after=None):
+    """Shows joined with their artist and venue, ordered by (start_time, id).
+
+    Parameters:
+        -after (tuple): (start_time, id) keyset cursor, only rows after it are returned
+
+    Returns:
+        -Query: rows with the columns used by pages/shows.html
+    """
+    query = db.session.query(
+        Show.id,
+        Show.start_time,
+        Show.venue_id,
+        Venue.name.label('venue_name'),
+        Show.artist_id,
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link')
+    ).join(Venue, Show.venue_id == Venue.id) \
+        .join(Artist, Show.artist_id == Artist.id)
+    if after is not None:
+        start_time, show_id = after
+        query = query.filter(or_(Show.start_time > start_time,
+                                 and_(Show.start_time == start_time, Show.id > show_id)))
+    return query.order_by(Show.start_time, Show.id)
+
+
+def format_show_row(row):
+    return {
+        "venue_id": row.venue_id,
+        "venue_name": row.venue_name,
+        "artist_id": row.artist_id,
+        "artist_name": row.artist_name,
+        "artist_image_link": row.artist_image_link,
+        "start_time": row.start_time
+    }
+
+
+# n-gram indexes used instead of pg_trgm (SEARCH_BACKEND = 'memory'), built on first search
+search_indexes = {}
+# held while an index is built, so a write made meanwhile waits and then refreshes it
+search_indexes_lock = threading.Lock()
+
+
+def get_search_index(model):
+    with search_indexes_lock:
+        index = search_indexes.get(model)
+        if index is None:
+            index = NgramIndex()
+            # read from the primary: a lagging replica would leave the index behind for good
+            with use_primary():
+                for row in db.session.query(model.id, model.name, model.city, model.state):
+                    index.add(row.id, (row.name, row.city, row.state))
+            search_indexes[model] = index
+    return index
+
+
+def refresh_search_index(model, *entity_ids):
+    """Re-read (or drop) entities in the in-process search index after a write"""
+    with search_indexes_lock:
+        index = search_indexes.get(model)
+    if index is None:
+        return
+    rows = db.session.query(model.id, model.name, model.city, model.state) \
+        .filter(model.id.in_(entity_ids)).all()
+    for entity_id in entity_ids:
+        index.remove(entity_id)
+    for row in rows:
+        index.add(row.id, (row.name, row.city, row.state))
+
+
+def search_entities(model, search_term, limit=None, genres=None):
+    """Venues or artists whose name, city or state contains search_term.
+
+    On Postgres the ILIKE predicates are served by the pg_trgm GIN indexes
+    and results are ranked by trigram similarity. With SEARCH_BACKEND =
+    'memory', or on another database, the in-process n-gram index is used.
+    genres, if given, restricts the results to entities having all of them.
+
+    Returns:
+        -tuple: (entities, total) best match first, total ignores the limit
+    """
+    fields = (model.name, model.city, model.state)
+    if db.engine.dialect.name == 'postgresql' and app.config.get('SEARCH_BACKEND', 'pg_trgm') == 'pg_trgm':
+        pattern = '%' + search_term + '%'
+        rank = func.greatest(*[func.similarity(field, search_term) for field in fields])
+        query = db.session.query(model, func.count(model.id).over().label('total')) \
+            .filter(or_(*[field.ilike(pattern) for field in fields]))
+        if genres:
+            query = query.filter(genre_filter(model, genres))
+        rows = query.order_by(rank.desc(), model.id).limit(limit).all()
+        return [row[0] for row in rows], rows[0].total if rows else 0
+
+    if not genres:
+        ids, total = get_search_index(model).search(search_term, limit)
+        entities = model.query.filter(model.id.in_(ids)).all() if ids else []
+    else:
+        ids, total = get_search_index(model).search(search_term)
+        entities = model.query.filter(model.id.in_(ids), genre_filter(model, genres)).all() if ids else []
+        total = len(entities)
+    by_id = {entity.id: entity for entity in entities}
+    return [by_id[entity_id] for entity_id in ids if entity_id in by_id][:limit], total
+
+
+def count_genres():
+    """Number of venues and artists per genre, in one aggregate query
+
+    Returns:
+        -dict: {'venues': {genre: count}, 'artists': {genre: count}}
+    """
+    facets = {'venues': {}, 'artists': {}}
+    unnested = union_all(
+        select(literal('venues').label('kind'), func.unnest(Venue.genres).label('genre')),
+        select(literal('artists').label('kind'), func.unnest(Artist.genres).label('genre'))
+    ).subquery()
+    rows = db.session.query(unnested.c.kind, unnested.c.genre, func.count().label('count')) \
+        .group_by(unnested.c.kind, unnested.c.genre) \
+        .order_by(unnested.c.kind, func.count().desc())
+    for kind, genre, count in rows:
+        facets[kind][genre] = count
+    return facets
+
+
+def stream_template(template_name, **context):
+    """Render a template chunk by chunk instead of into one string"""
+    app.update_template_context(context)
+    template = app.jinja_env.get_template(template_name)
+    return template.stream(context)
+
+
+def load_schedule(kind, entity_id):
+    """Start times of the shows of a 'venue' or an 'artist', for the availability index"""
+    key = Show.venue_id if kind == 'venue' else Show.artist_id
+    return [row.start_time for row in db.session.query(Show.start_time).filter(key == entity_id)]
+
+
+availability = AvailabilityIndex(timedelta(hours=app.config.get('SHOW_DURATION_HOURS', 3)),
+                                 load_schedule)
+
+
+def load_seeking(kind, entity_ids=None):
+    """(id, genres, city, state) of the venues seeking talent or the artists seeking a venue"""
+    model, seeking = (Venue, Venue.seeking_talent) if kind == 'venue' else (Artist, Artist.seeking_venue)
+    query = db.session.query(model.id, model.genres, model.city, model.state).filter(seeking.is_(True))
+    if entity_ids is not None:
+        query = query.filter(model.id.in_(entity_ids))
+    # read from the primary, like the search indexes
+    with use_primary():
+        return query.all()
+
+
+matches = MatchIndex(load_seeking)
+
+
+def load_recent(kind, size):
+    """The `size` most recently listed venues, artists or shows, newest first"""
+    if kind == 'show':
+        rows = query_show_feed().order_by(None).order_by(Show.id.desc()).limit(size)
+        return [{
+            'id': row.id,
+            'venue_id': row.venue_id,
+            'venue_name': row.venue_name,
+            'artist_id': row.artist_id,
+            'artist_name': row.artist_name,
+            'start_time': row.start_time
+        } for row in rows]
+    model = Venue if kind == 'venue' else Artist
+    rows = db.session.query(model.id, model.name).order_by(model.id.desc()).limit(size)
+    return [{'id': row.id, 'name': row.name} for row in rows]
+
+
+recent_activity = RecentActivity(load_recent, app.config.get('RECENT_ACTIVITY_SIZE', 10))
+
+
+def find_matches(model, entity_id, limit):
+    """Seeking artists for a venue, or seeking venues for an artist, best first
+
+    Candidates come from the genre/state index; show history is one grouped
+    query over the shows of the entity, and only the winners are loaded.
+    """
+    entity = db.session.query(model.id, model.genres, model.city, model.state) \
+        .filter(model.id == entity_id).first()
+    if entity is None:
+        return None
+    counterpart = Artist if model is Venue else Venue
+    other_key = SHOW_KEYS[counterpart]
+    history = dict(db.session.query(other_key, func.count(Show.id))
+                   .filter(SHOW_KEYS[model] == entity_id, Show.start_time < datetime.now())
+                   .group_by(other_key))
+    ranked = matches.match('artist' if model is Venue else 'venue', entity.genres, entity.city,
+                           entity.state, history=history, limit=limit)
+    by_id = {row.id: row for row in counterpart.query.filter(
+        counterpart.id.in_([candidate_id for _, candidate_id, _ in ranked]))} if ranked else {}
+    return [{
+        'id': candidate_id,
+        'name': by_id[candidate_id].name,
+        'city': by_id[candidate_id].city,
+        'state': by_id[candidate_id].state,
+        'genres': by_id[candidate_id].genres,
+        'image_link': by_id[candidate_id].image_link,
+        'seeking_description': by_id[candidate_id].seeking_description,
+        'score': score,
+        'shared_genres': shared,
+        'shows_together': history.get(candidate_id, 0)
+    } for score, candidate_id, shared in ranked if candidate_id in by_id]
+
+
+# ----------------------------------------------------------------------------#
+# Show counters.
+# ----------------------------------------------------------------------------#
+#  venue_show_stats / artist_show_stats hold total and upcoming show counts
+#  plus the next and last show time of every venue and artist. A new show
+#  bumps the two rows it touches; deletes and imports recompute the rows of
+#  the affected entities; `flask roll-show-stats` moves passed shows from
+#  upcoming to past and should run periodically (e.g. every few minutes
+#  from cron). Callers commit.
+
+def recompute_show_stats(model, entity_ids=None):
+    """Rebuild the counter rows of some (or all) venues or artists from shows"""
+    stats, stats_key = SHOW_STATS[model]
+    now = datetime.now()
+    upcoming = Show.start_time >= now
+    query = db.session.query(
+        model.id,
+        func.count(Show.id),
+        func.sum(case((upcoming, 1), else_=0)),
+        func.min(case((upcoming, Show.start_time))),
+        func.max(case((Show.start_time < now, Show.start_time)))
+    ).outerjoin(Show, SHOW_KEYS[model] == model.id).group_by(model.id)
+    delete = stats.__table__.delete()
+    if entity_ids is not None:
+        entity_ids = list(entity_ids)
+        if not entity_ids:
+            return
+        query = query.filter(model.id.in_(entity_ids))
+        delete = delete.where(stats_key.in_(entity_ids))
+
+    rows = [{
+        stats_key.key: entity_id,
+        'total_shows': total,
+        'upcoming_shows': upcoming_count or 0,
+        'next_show_at': next_show_at,
+        'last_show_at': last_show_at,
+    } for entity_id, total, upcoming_count, next_show_at, last_show_at in query]
+    db.session.execute(delete)
+    if rows:
+        db.session.execute(stats.__table__.insert(), rows)
+
+
+def bump_show_stats(venue_id, artist_id, start_time):
+    """Account for a newly inserted show in the counters of its venue and artist"""
+    db.session.flush()
+    is_upcoming = start_time >= datetime.now()
+    for model, entity_id in ((Venue, venue_id), (Artist, artist_id)):
+        stats, stats_key = SHOW_STATS[model]
+        table = stats.__table__
+        values = {'total_shows': table.c.total_shows + 1}
+        if is_upcoming:
+            values['upcoming_shows'] = table.c.upcoming_shows + 1
+            values['next_show_at'] = case(
+                (or_(table.c.next_show_at.is_(None), table.c.next_show_at > start_time), start_time),
+                else_=table.c.next_show_at)
+        else:
+            values['last_show_at'] = case(
+                (or_(table.c.last_show_at.is_(None), table.c.last_show_at < start_time), start_time),
+                else_=table.c.last_show_at)
+        result = db.session.execute(table.update().where(stats_key == entity_id).values(values))
+        if result.rowcount == 0:  # no counters yet, the new show is already flushed
+            recompute_show_stats(model, [entity_id])
+
+
+def roll_show_stats():
+    """Recompute the counters of entities whose next show has started
+
+    Returns:
+        -int: number of venues and artists updated
+    """
+    now = datetime.now()
+    rolled = 0
+    for model, (stats, stats_key) in SHOW_STATS.items():
+        entity_ids = [row[0] for row in db.session.query(stats_key).filter(stats.next_show_at <= now)]
+        recompute_show_stats(model, entity_ids)
+        rolled += len(entity_ids)
+    return rolled
+
+
+# ----------------------------------------------------------------------------#
+# Page cache.
+# ----------------------------------------------------------------------------#
+
+def cached_page(view):
+    """Serve a rendered page from page_cache, keyed by endpoint, entity id and query string.
+
+    Pages carrying a pending flash message are neither read from nor
+    written to the cache. Pages going into the cache are rendered from the
+    primary: a lagging replica would otherwise keep serving every user the
+    state from before a write for PAGE_CACHE_TTL.
+    """
+    @wraps(view)
+    def wrapper(**kwargs):
+        if page_cache is None or session.get('_flashes'):
+            return view(**kwargs)
+        group = (request.endpoint,) + tuple(kwargs.values())
+        key = group + (request.query_string.decode(),)
+        page = page_cache.get(key, group)
+        if page is None:
+            with use_primary():
+                page = view(**kwargs)
+            if isinstance(page, str):
+                page_cache.set(key, page, group)
+        return page
+    return wrapper
+
+
+def evict_pages(*groups):
+    """Drop cached pages after a write, e.g. evict_pages(('venues',), ('show_venue', 3))"""
+    if page_cache is None:
+        return
+    for group in groups:
+        page_cache.evict(group)
+
+
+def evict_show_pages(venue_ids=(), artist_ids=()):
+    evict_pages(*[('show_venue', venue_id) for venue_id in set(venue_ids)])
+    evict_pages(*[('show_artist', artist_id) for artist_id in set(artist_ids)])
+
+
+def cached_genre_facets():
+    if page_cache is None:
+        return count_genres()
+    group = ('genre_facets',)
+    facets = page_cache.get(group, group)
+    if facets is None:
+        facets = count_genres()
+        page_cache.set(group, facets, group)
+    return facets
+
+
+def show_counterpart_ids(model, *entity_ids):
+    """Ids on the other side of the entities' shows, whose pages list those entities"""
+    other_key = SHOW_KEYS[Artist if model is Venue else Venue]
+    rows = db.session.query(other_key).filter(SHOW_KEYS[model].in_(entity_ids)).distinct()
+    return [row[0] for row in rows]
+
+
+def delete_entities(model, entity_ids):
+    """Delete venues or artists with one DELETE statement and commit.
+
+    Their shows are removed by the database (ON DELETE CASCADE), so no Show
+    is loaded into the session.
+
+    Returns:
+        -list: (id, name) rows of the deleted entities
+    """
+    entity_ids = [int(entity_id) for entity_id in entity_ids]
+    if not entity_ids:
+        return []
+    counterpart_ids = show_counterpart_ids(model, *entity_ids)
+    deleted = db.session.execute(
+        model.__table__.delete()
+        .where(model.id.in_(entity_ids))
+        .returning(model.id, model.name)
+    ).fetchall()
+    recompute_show_stats(Artist if model is Venue else Venue, counterpart_ids)
+    db.session.commit()
+
+    deleted_ids = [row.id for row in deleted]
+    refresh_search_index(model, *deleted_ids)
+    matches.refresh('venue' if model is Venue else 'artist', *deleted_ids)
+    if deleted_ids:
+        recent_activity.clear()
+    if model is Venue:
+        evict_pages(('index',), ('venues',), ('genre_facets',))
+        evict_show_pages(venue_ids=deleted_ids, artist_ids=counterpart_ids)
+        availability.forget('venue', *deleted_ids)
+        availability.forget('artist', *counterpart_ids)
+    else:
+        evict_pages(('index',), ('artists',), ('genre_facets',))
+        evict_show_pages(venue_ids=counterpart_ids, artist_ids=deleted_ids)
+        availability.forget('artist', *deleted_ids)
+        availability.forget('venue', *counterpart_ids)
+    return deleted
+
+
+def delete_entities_response(model, entity_ids):
+    """JSON answer shared by the single and batch delete endpoints"""
+    label = model.__name__
+    try:
+        deleted = delete_entities(model, entity_ids)
+    except (SQLAlchemyError, ValueError, TypeError):
+        db.session.rollback()
+        app.logger.exception('%s delete failed', label)
+        flash('An error occurred. {} could not be deleted.'.format(label))
+        return jsonify({'success': False}), 422
+    finally:
+        db.session.close()
+
+    if not deleted:
+        return jsonify({'success': False, 'deleted': []}), 404
+    # one message per request: flashes live in the session cookie, which
+    # browsers drop past 4 KB, so a batch must not flash every name
+    if len(deleted) == 1:
+        flash(label + ' ' + deleted[0].name + ' was deleted successfully!')
+    else:
+        flash('{} {}s were deleted successfully!'.format(len(deleted), label.lower()))
+    return jsonify({'success': True, 'deleted': [entity_id for entity_id, _ in deleted]})
+
+
+def changed_columns(entity, values):
+    """Submitted values that differ from the loaded row ('' and None count as equal)"""
+    changes = {}
+    for name, value in values.items():
+        current = getattr(entity, name)
+        if isinstance(value, list):
+            if sorted(current or []) != sorted(value):
+                changes[name] = value
+        elif (current if current != '' else None) != (value if value != '' else None):
+            changes[name] = value
+    return changes
+
+
+def save_edit(model, entity, values, version=None):
+    """Write only the changed columns of a venue or artist and commit.
+
+    Nothing is written when no column changed. `version` is the row version
+    the edit form was rendered from: an edit based on an older version is
+    refused, and the version_id_col check of the UPDATE catches a write
+    racing this one.
+
+    Returns:
+        -str: 'updated', 'unchanged', 'conflict' or 'error'
+    """
+    entity_id = entity.id
+    try:
+        if version is not None and entity.version != version:
+            return 'conflict'
+        changes = changed_columns(entity, values)
+        if not changes:
+            return 'unchanged'
+        for name, value in changes.items():
+            setattr(entity, name, value)
+        db.session.commit()
+    except StaleDataError:
+        db.session.rollback()
+        return 'conflict'
+    except SQLAlchemyError:
+        db.session.rollback()
+        app.logger.exception('%s %s update failed', model.__name__, entity_id)
+        return 'error'
+    finally:
+        db.session.close()
+
+    changed = set(changes)
+    kind = 'venue' if model is Venue else 'artist'
+    if 'name' in changed:
+        recent_activity.update(kind, entity_id, name=changes['name'])
+    if changed & {'name', 'city', 'state'}:
+        refresh_search_index(model, entity_id)
+    if changed & {'genres', 'city', 'state', 'seeking_talent', 'seeking_venue'}:
+        matches.refresh(kind, entity_id)
+    evict_pages(('index',), (kind + 's',), *([('genre_facets',)] if 'genres' in changed else []))
+    # show pages embed the name and image of the other side of every show
+    counterpart_ids = show_counterpart_ids(model, entity_id) if changed & {'name', 'image_link'} else []
+    if model is Venue:
+        evict_show_pages(venue_ids=[entity_id], artist_ids=counterpart_ids)
+    else:
+        evict_show_pages(venue_ids=counterpart_ids, artist_ids=[entity_id])
+    return 'updated'
+
+
 # ----------------------------------------------------------------------------#
 # Filters.
 # ----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):  # format = date_format
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format)
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+@lru_cache(maxsize=64)
+def datetime_formatter(format='medium', locale=None):
+    """Compile a babel pattern once per (format, locale)
+
+    Returns:
+        -function: formats a datetime with the compiled pattern
+    """
+    locale = babel.Locale.parse(locale or babel.dates.LC_TIME)
+    pattern = DATETIME_FORMATS.get(format, format)
+    if pattern in ('short', 'long'):  # babel's own locale-dependent formats
+        return lambda date: babel.dates.format_datetime(date, pattern, locale=locale)
+    compiled = babel.dates.parse_pattern(pattern)
+    return lambda date: compiled.apply(date, locale)
+
+
+def format_datetime(value, format='medium', locale=None):  # format = date_format
+    if isinstance(value, str):
+        value = dateutil.parser.parse(value)
+    return datetime_formatter(format, locale)(value)
+
+
+def format_datetimes(rows, format='medium', key='start_time', locale=None):
+    """Format the datetime under `key` of every row for a list page
+
+    The formatted text is stored under `key + '_text'`. Rows sharing the
+    same datetime are formatted once.
+    """
+    formatter = datetime_formatter(format, locale)
+    formatted = {}
+    for row in rows:
+        value = row[key]
+        if value not in formatted:
+            formatted[value] = formatter(value)
+        row[key + '_text'] = formatted[value]
+    return rows
 
 
 app.jinja_env.filters['datetime'] = format_datetime
@@ -104,43 +853,48 @@ app.jinja_env.filters['datetime'] = format_datetime
 # Controllers.
 # ----------------------------------------------------------------------------#
 
+def home_page():
+    recent = recent_activity.latest()
+    return render_template('pages/home.html',
+                           venues=recent['venue'],
+                           artists=recent['artist'],
+                           shows=recent['show'])
+
+
 @app.route('/')
+@cached_page
 def index():
-    return render_template('pages/home.html',
-                           artists=Artist.query.order_by('id').limit(10),
-                           venues=Venue.query.order_by('id').limit(10)
-                           )
+    return home_page()
 
 
 #  Venues
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@cached_page
+@read_only
 def venues():
-    data = []
-    venues_cities = db.session.query(Venue.city, Venue.state).group_by(
-        Venue.city, Venue.state).order_by(Venue.city)
-    for city, state in venues_cities:
-        venues = Venue.query.filter_by(city=city, state=state).all()
-        venues_areas = {
-            "city": city,
-            "state": state,
-            "venues": venues,
-        }
-        data.append(venues_areas)
-    return render_template('pages/venues.html', areas=data)
+    per_area = request.args.get('per_area', app.config.get('VENUES_PER_AREA'), type=int)
+    page = request.args.get('page', 1, type=int)
+    data = load_venue_areas(per_area=per_area,
+                            city=request.args.get('city'),
+                            state=request.args.get('state'),
+                            page=max(page, 1),
+                            genres=request.args.getlist('genre'),
+                            sort=request.args.get('sort'))
+    return render_template('pages/venues.html', areas=data, per_area=per_area,
+                           genres=request.args.getlist('genre'),
+                           sort=request.args.get('sort'))
 
 
 @app.route('/venues/search', methods=['POST'])
+@read_only
 def search_venues():
     search_term = request.form.get('search_term', '')
-    search_result = Venue.query.filter(
-                    or_ (Venue.name.ilike('%' + search_term + '%'),
-                         Venue.city.ilike('%' + search_term + '%'),
-                         Venue.state.ilike('%' + search_term + '%')
-                        )
-                    ).all()
-    count = len(search_result)
+    genres = request.form.getlist('genre') or request.args.getlist('genre')
+    search_result, count = search_entities(Venue, search_term,
+                                           limit=app.config.get('SEARCH_RESULT_LIMIT'),
+                                           genres=genres)
     response = {
         "count": count,
         "data": search_result
@@ -151,29 +905,14 @@ def search_venues():
 
 
 @app.route('/venues/<int:venue_id>')
+@cached_page
+@read_only
 def show_venue(venue_id):
     # shows the venue page with the given venue_id
-    venue = Venue.query.get(venue_id)
-    upcoming_shows = []
-    past_shows = []
-    current_time = datetime.now()
-    for show in venue.shows:
-        artist = Artist.query.get(show.artist_id)
-        start_time = show.start_time
-        if current_time > start_time:
-            past_shows.append({
-                "artist_id": artist.id,
-                "artist_name": artist.name,
-                "artist_image_link": artist.image_link,
-                "start_time": str(start_time)
-            })
-        else:
-            upcoming_shows.append({
-                "artist_id": artist.id,
-                "artist_name": artist.name,
-                "artist_image_link": artist.image_link,
-                "start_time": str(start_time)
-            })
+    venue, past_shows, upcoming_shows, past_count, upcoming_count = \
+        load_show_timeline(Venue, Artist, venue_id)
+    if venue is None:
+        abort(404)
 
     show_info = {
         'id': venue.id,
@@ -188,15 +927,78 @@ def show_venue(venue_id):
         'facebook_link': venue.facebook_link,
         'seeking_talent': venue.seeking_talent,
         'seeking_description': venue.seeking_description,
-        'past_shows': past_shows,
-        'upcoming_shows': upcoming_shows,
-        'upcoming_shows_count': len(upcoming_shows),
-        'past_shows_count': len(past_shows)
+        'past_shows': format_datetimes(past_shows, 'full'),
+        'upcoming_shows': format_datetimes(upcoming_shows, 'full'),
+        'upcoming_shows_count': upcoming_count,
+        'past_shows_count': past_count
     }
 
     return render_template('pages/show_venue.html', venue=show_info)
 
 
+#  Genres
+#  ----------------------------------------------------------------
+
+@app.route('/genres')
+def genre_facets():
+    return jsonify(cached_genre_facets())
+
+
+#  Availability
+#  ----------------------------------------------------------------
+
+def free_slots_response(kind, entity_id):
+    """Free periods of a venue or artist between ?start= and ?end= (ISO datetimes)"""
+    model = Venue if kind == 'venue' else Artist
+    if db.session.query(model.id).filter(model.id == entity_id).first() is None:
+        abort(404)
+    try:
+        begin = parse_naive(request.args['start'])
+        end = parse_naive(request.args['end'])
+    except (KeyError, ValueError):
+        abort(400)
+    slots = availability.free_slots(kind, entity_id, begin, end)
+    return jsonify({
+        'free_slots': [{'start': start.isoformat(), 'end': until.isoformat()} for start, until in slots],
+        'show_duration_minutes': int(availability.duration.total_seconds() // 60)
+    })
+
+
+@app.route('/venues/<int:venue_id>/availability')
+def venue_availability(venue_id):
+    return free_slots_response('venue', venue_id)
+
+
+@app.route('/artists/<int:artist_id>/availability')
+def artist_availability(artist_id):
+    return free_slots_response('artist', artist_id)
+
+
+#  Matchmaking
+#  ----------------------------------------------------------------
+
+def matches_response(model, entity_id):
+    limit = min(max(request.args.get('limit', 10, type=int), 1), app.config.get('MATCH_LIMIT', 50))
+    found = find_matches(model, entity_id, limit)
+    if found is None:
+        abort(404)
+    return jsonify({'matches': found})
+
+
+@app.route('/venues/<int:venue_id>/matches')
+@read_only
+def venue_matches(venue_id):
+    # artists seeking a venue that fit this venue
+    return matches_response(Venue, venue_id)
+
+
+@app.route('/artists/<int:artist_id>/matches')
+@read_only
+def artist_matches(artist_id):
+    # venues seeking talent that fit this artist
+    return matches_response(Artist, artist_id)
+
+
 #  Create Venue
 #  ----------------------------------------------------------------
 
@@ -225,55 +1027,55 @@ def create_venue_submission():
         )
         db.session.add(venue)
         db.session.commit()
+        refresh_search_index(Venue, venue.id)
+        matches.refresh('venue', venue.id)
+        recent_activity.record('venue', {'id': venue.id, 'name': venue.name})
+        evict_pages(('index',), ('venues',), ('genre_facets',))
         flash('Venue ' + request.form['name'] + ' was successfully listed!')
     except ValueError:
         flash('An error occurred. Venue ' + form.name + ' could not be listed.')
 
-    return render_template('pages/home.html')
+    return home_page()
 
 
 @app.route('/venues/<venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
-    error = False
-    try:
-        venue_name = Venue.query.get(venue_id).name
-        Venue.query.filter_by(id=venue_id).delete()
-        db.session.commit()
-    except:
-        error = True
-        db.session.rollback()
-        print(sys.exc_info())
-    finally:
-        db.session.close()
+    return delete_entities_response(Venue, [venue_id])
 
-    if error:  # on unsuccessful db insert, flash an error instead.
-        flash('An error occurred. Venue ' + venue_name + ' could not be listed.')
-        return jsonify({'success': False})
-    else:
-        flash('Venue ' + venue_name + ' was deleted successfully!')
-        return jsonify({'success': True})
 
-    return render_template('pages/home.html')
+@app.route('/venues', methods=['DELETE'])
+def delete_venues():
+    # body: {"ids": [1, 2, 3]}
+    body = request.get_json(silent=True) or {}
+    return delete_entities_response(Venue, body.get('ids') or [])
 
 
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@cached_page
+@read_only
 def artists():
-    all_artists = Artist.query.order_by('name').all()
+    query = Artist.query
+    genres = request.args.getlist('genre')
+    if genres:
+        query = query.filter(genre_filter(Artist, genres))
+    sort = request.args.get('sort')
+    if sort in STATS_SORTS:
+        query = query.outerjoin(ArtistShowStats, ArtistShowStats.artist_id == Artist.id) \
+            .order_by(STATS_SORTS[sort](ArtistShowStats))
+    all_artists = query.order_by(Artist.name).all()
     return render_template('pages/artists.html', artists=all_artists)
 
 
 @app.route('/artists/search', methods=['POST'])
+@read_only
 def search_artists():
     search_term = request.form.get('search_term', '')
-    search_result = Artist.query.filter(
-                        or_ (Artist.name.ilike('%' + search_term + '%'),
-                             Artist.city.ilike('%' + search_term + '%'),
-                             Artist.state.ilike('%' + search_term + '%')
-                             )
-                        ).all()
-    count = len(search_result)
+    genres = request.form.getlist('genre') or request.args.getlist('genre')
+    search_result, count = search_entities(Artist, search_term,
+                                           limit=app.config.get('SEARCH_RESULT_LIMIT'),
+                                           genres=genres)
     response = {
         "count": count,
         "data": search_result
@@ -284,28 +1086,14 @@ def search_artists():
 
 
 @app.route('/artists/<int:artist_id>')
+@cached_page
+@read_only
 def show_artist(artist_id):
-    artist = Artist.query.get(artist_id)
-    upcoming_shows = []
-    past_shows = []
-    current_time = datetime.now()
-    for show in artist.shows:
-        venue = Venue.query.get(show.venue_id)
-        start_time = show.start_time
-        if current_time > show.start_time:
-            past_shows.append({
-                "venue_id": venue.id,
-                "venue_name": venue.name,
-                "venue_image_link": venue.image_link,
-                "start_time": str(start_time)
-            })
-        else:
-            upcoming_shows.append({
-                "venue_id": venue.id,
-                "venue_name": venue.name,
-                "venue_image_link": venue.image_link,
-                "start_time": str(start_time)
-            })
+    artist, past_shows, upcoming_shows, past_count, upcoming_count = \
+        load_show_timeline(Artist, Venue, artist_id)
+    if artist is None:
+        abort(404)
+
     show_info = {
         'id': artist.id,
         'name': artist.name,
@@ -318,10 +1106,10 @@ def show_artist(artist_id):
         'facebook_link': artist.facebook_link,
         'seeking_venue': artist.seeking_venue,
         'seeking_description': artist.seeking_description,
-        'past_shows': past_shows,
-        'upcoming_shows': upcoming_shows,
-        'upcoming_shows_count': len(upcoming_shows),
-        'past_shows_count': len(past_shows)
+        'past_shows': format_datetimes(past_shows, 'full'),
+        'upcoming_shows': format_datetimes(upcoming_shows, 'full'),
+        'upcoming_shows_count': upcoming_count,
+        'past_shows_count': past_count
     }
     return render_template('pages/show_artist.html', artist=show_info)
 
@@ -330,76 +1118,87 @@ def show_artist(artist_id):
 #  ----------------------------------------------------------------
 @app.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
-    form = ArtistForm()
-    artist = Artist.query.get(artist_id)
+    artist = Artist.query.get_or_404(artist_id)
+    form = ArtistForm(obj=artist)
+    form.seeking_venue.data = '1' if artist.seeking_venue else '0'
     return render_template('forms/edit_artist.html', form=form, artist=artist)
 
 
 @app.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
-    error = False
+    artist = Artist.query.get_or_404(artist_id)
+    name = request.form.get('name', artist.name)
     try:
-        artist = Artist.query.get(artist_id)
-        artist.name = request.form['name']
-        artist.city = request.form['city']
-        artist.state = request.form['state']
-        artist.phone = request.form['phone']
-        artist.genres = request.form.getlist('genres')
-        artist.website = request.form['website']
-        artist.facebook_link = request.form['facebook_link']
-        artist.image_link = request.form['image_link']
-        artist.seeking_venue = int(request.form['seeking_venue'])
-        artist.seeking_description = request.form['seeking_description']
-        db.session.commit()
-    except:
-        error = True
-        db.session.rollback()
-        print(sys.exc_info())
-    finally:
-        db.session.close()
-
-    if error:  # on unsuccessful db insert, flash an error instead.
-        flash('An error occurred. Artist ' + request.form['name'] + ' could not be listed.')
+        values = {
+            'name': request.form['name'],
+            'city': request.form['city'],
+            'state': request.form['state'],
+            'phone': request.form['phone'],
+            'genres': request.form.getlist('genres'),
+            'website': request.form['website'],
+            'facebook_link': request.form['facebook_link'],
+            'image_link': request.form['image_link'],
+            'seeking_venue': bool(int(request.form['seeking_venue'])),
+            'seeking_description': request.form['seeking_description']
+        }
+    except (KeyError, ValueError):  # a missing field, or a seeking flag other than 0/1
+        status = 'error'
     else:
-        flash('Artist ' + request.form['name'] + ' was updated successfully!')
+        status = save_edit(Artist, artist, values, version=request.form.get('version', type=int))
+
+    if status == 'error':  # on unsuccessful db update, flash an error instead.
+        flash('An error occurred. Artist ' + name + ' could not be updated.')
+    elif status == 'conflict':
+        flash('Artist ' + name + ' was changed by someone else meanwhile. '
+              'Please review the changes and edit it again.')
+    elif status == 'unchanged':
+        flash('Nothing to update for Artist ' + name + '.')
+    else:
+        flash('Artist ' + name + ' was updated successfully!')
 
     return redirect(url_for('show_artist', artist_id=artist_id))
 
 
 @app.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
-    form = VenueForm()
-    venue = Venue.query.get(venue_id)
+    venue = Venue.query.get_or_404(venue_id)
+    form = VenueForm(obj=venue)
+    form.seeking_talent.data = '1' if venue.seeking_talent else '0'
     return render_template('forms/edit_venue.html', form=form, venue=venue)
 
 
 @app.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
-    error = False
+    venue = Venue.query.get_or_404(venue_id)
+    name = request.form.get('name', venue.name)
     try:
-        venue = Venue.query.get(venue_id)
-        venue.name = request.form['name']
-        venue.city = request.form['city']
-        venue.state = request.form['state']
-        venue.address = request.form['address']
-        venue.phone = request.form['phone']
-        venue.genres = request.form.getlist('genres')
-        venue.website = request.form['website']
-        venue.facebook_link = request.form['facebook_link']
-        venue.image_link = request.form['image_link']
-        venue.seeking_talent = int(request.form['seeking_talent'])
-        venue.seeking_description = request.form['seeking_description']
-        db.session.commit()
-    except:
-        error = True
-        db.session.rollback()
-        print(sys.exc_info())
-    finally:
-        db.session.close()
-    if error:  # on unsuccessful db insert, flash an error instead.
-        flash('An error occurred! Venue ' + request.form['name'] + ' could not be updated.')
+        values = {
+            'name': request.form['name'],
+            'city': request.form['city'],
+            'state': request.form['state'],
+            'address': request.form['address'],
+            'phone': request.form['phone'],
+            'genres': request.form.getlist('genres'),
+            'website': request.form['website'],
+            'facebook_link': request.form['facebook_link'],
+            'image_link': request.form['image_link'],
+            'seeking_talent': bool(int(request.form['seeking_talent'])),
+            'seeking_description': request.form['seeking_description']
+        }
+    except (KeyError, ValueError):  # a missing field, or a seeking flag other than 0/1
+        status = 'error'
+    else:
+        status = save_edit(Venue, venue, values, version=request.form.get('version', type=int))
+
+    if status == 'error':  # on unsuccessful db update, flash an error instead.
+        flash('An error occurred! Venue ' + name + ' could not be updated.')
+    elif status == 'conflict':
+        flash('Venue ' + name + ' was changed by someone else meanwhile. '
+              'Please review the changes and edit it again.')
+    elif status == 'unchanged':
+        flash('Nothing to update for Venue ' + name + '.')
     else:
-        flash('Venue ' + request.form['name'] + ' was successfully updated!')
+        flash('Venue ' + name + ' was successfully updated!')
 
     return redirect(url_for('show_venue', venue_id=venue_id))
 
@@ -431,57 +1230,55 @@ def create_artist_submission():
         )
         db.session.add(new_artist)
         db.session.commit()
+        refresh_search_index(Artist, new_artist.id)
+        matches.refresh('artist', new_artist.id)
+        recent_activity.record('artist', {'id': new_artist.id, 'name': new_artist.name})
+        evict_pages(('index',), ('artists',), ('genre_facets',))
         flash('Artist ' + request.form['name'] + ' was successfully listed!')
     except ValueError:
         flash('An error occurred. Artist ' + form.name + ' could not be listed.')
 
-    return render_template('pages/home.html')
+    return home_page()
 
 
 @app.route('/artists/<artist_id>', methods=['DELETE'])
 def delete_artist(artist_id):
-    error = False
-    try:
-        artist_name = Artist.query.get(artist_id).name
-        Artist.query.filter_by(id=artist_id).delete()
-        db.session.commit()
-    except:
-        error = True
-        db.session.rollback()
-        print(sys.exc_info())
-    finally:
-        db.session.close()
+    return delete_entities_response(Artist, [artist_id])
 
-    if error:  # on unsuccessful db insert, flash an error instead.
-        flash('An error occurred. Venue ' + artist_name + ' could not be listed.')
-        return jsonify({'success': False})
-    else:
-        flash('Venue ' + artist_name + ' was deleted successfully!')
-        return jsonify({'success': True})
 
-    return render_template('pages/home.html')
+@app.route('/artists', methods=['DELETE'])
+def delete_artists():
+    # body: {"ids": [1, 2, 3]}
+    body = request.get_json(silent=True) or {}
+    return delete_entities_response(Artist, body.get('ids') or [])
+
 
 #  Shows
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@read_only
 def shows():
-    data = []
-    all_shows = Show.query.order_by('start_time').all()
-    for show in all_shows:
-        artist = Artist.query.get(show.artist_id)
-        venue_name = Venue.query.get(show.venue_id).name
-        show_info = {
-            "venue_id": show.venue_id,
-            "venue_name": venue_name,
-            "artist_id": show.artist_id,
-            "artist_name": artist.name,
-            "artist_image_link": artist.image_link,
-            "start_time": str(show.start_time)
-        }
-        data.append(show_info)
+    after = decode_show_cursor(request.args.get('after'))
+    query = query_show_feed(after)
+    per_page = app.config.get('SHOWS_PER_PAGE', 30)
+    stream = request.args.get('stream', int(app.config.get('SHOWS_STREAM', False)), type=int)
+
+    if stream:
+        # rows are fetched lazily while the page is being sent
+        rows = (format_datetimes([format_show_row(row)], 'full')[0]
+                for row in query.yield_per(per_page))
+        return Response(stream_with_context(
+            stream_template('pages/shows.html', shows=rows, next_cursor=None)))
 
-    return render_template('pages/shows.html', shows=data)
+    rows = query.limit(per_page + 1).all()
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_show_cursor(rows[-1].start_time, rows[-1].id)
+
+    data = format_datetimes([format_show_row(row) for row in rows], 'full')
+    return render_template('pages/shows.html', shows=data, next_cursor=next_cursor)
 
 
 @app.route('/shows/create', methods=['GET'])
@@ -493,14 +1290,41 @@ def create_shows():
 @app.route('/shows/create', methods=['POST'])
 def create_show_submission():
     error = False
+    # the show form carries no CSRF token, like the other forms of the site
+    form = ShowForm(request.form, meta={'csrf': False})
+    if not form.validate():
+        flash('Show could not be listed: ' + ' '.join(
+            message for messages in form.errors.values() for message in messages))
+        return home_page()
     try:
+        venue_id = int(request.form['venue_id'])
+        artist_id = int(request.form['artist_id'])
+        start_time = form.start_time.data
+        booked = availability.conflicts(venue_id, artist_id, start_time)
+        if booked:
+            flash('Show could not be listed: the {} {} already booked at that time.'
+                  .format(' and the '.join(booked), 'are' if len(booked) > 1 else 'is'))
+            return home_page()
+
         show_info = Show(
-            artist_id=request.form['artist_id'],
-            venue_id=request.form['venue_id'],
-            start_time=request.form['start_time']
+            artist_id=artist_id,
+            venue_id=venue_id,
+            start_time=start_time
         )
         db.session.add(show_info)
+        bump_show_stats(venue_id, artist_id, start_time)
         db.session.commit()
+        availability.book(venue_id, artist_id, start_time)
+        recent_activity.record('show', {
+            'id': show_info.id,
+            'venue_id': venue_id,
+            'venue_name': db.session.get(Venue, venue_id).name,
+            'artist_id': artist_id,
+            'artist_name': db.session.get(Artist, artist_id).name,
+            'start_time': start_time
+        })
+        evict_pages(('index',))
+        evict_show_pages(venue_ids=[venue_id], artist_ids=[artist_id])
     except:
         error = True
         db.session.rollback()
@@ -513,11 +1337,177 @@ def create_show_submission():
     else:
         flash('Show was successfully listed!')
 
-    return render_template('pages/home.html')
+    return home_page()
+
+
+#  API
+#  ----------------------------------------------------------------
+#  JSON mirror of the /venues, /artists and /shows pages. Every response
+#  carries a strong ETag computed from row versions by a small validator
+#  query, so an If-None-Match hit returns 304 before anything is loaded
+#  or serialized.
+
+API_FIELDS = {
+    Venue: ('id', 'name', 'city', 'state', 'address', 'phone', 'genres', 'website',
+            'image_link', 'facebook_link', 'seeking_talent', 'seeking_description'),
+    Artist: ('id', 'name', 'city', 'state', 'phone', 'genres', 'website',
+             'image_link', 'facebook_link', 'seeking_venue', 'seeking_description'),
+    Show: ('id', 'venue_id', 'venue_name', 'artist_id', 'artist_name',
+           'artist_image_link', 'start_time'),
+}
+API_SHOW_FIELDS = ('past_shows', 'upcoming_shows', 'past_shows_count', 'upcoming_shows_count')
+
+
+def api_fields(allowed):
+    """Sparse fieldset from ?fields=a,b (400 on unknown fields), all fields by default"""
+    requested = request.args.get('fields')
+    if not requested:
+        return allowed
+    fields = tuple(field for field in requested.split(',') if field)
+    if not fields or any(field not in allowed for field in fields):
+        abort(400)
+    return fields
+
+
+def api_limit():
+    limit = request.args.get('limit', app.config.get('API_PAGE_SIZE', 50), type=int)
+    return min(max(limit, 1), app.config.get('API_MAX_PAGE_SIZE', 500))
+
+
+def json_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def conditional_json(validator, build):
+    """Answer with 304 if the client's ETag matches, else build and serialize the body
+
+    Parameters:
+        -validator: anything cheap whose repr changes whenever the body would
+        -build (function): returns the JSON body, only called on a cache miss
+    """
+    etag = hashlib.sha1(repr((request.full_path, validator)).encode('utf-8')).hexdigest()
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    return response
+
+
+def api_entity_list(model):
+    fields = api_fields(API_FIELDS[model])
+    after = request.args.get('after', 0, type=int)
+    limit = api_limit()
+    page = model.query.filter(model.id > after).order_by(model.id).limit(limit)
+    versions = page.with_entities(model.id, model.version).all()
+
+    def build():
+        columns = [getattr(model, field) for field in fields]
+        rows = page.with_entities(model.id, *columns).all()
+        return {
+            'data': [{field: json_value(value) for field, value in zip(fields, row[1:])}
+                     for row in rows],
+            'next': versions[-1].id if len(versions) == limit else None
+        }
+
+    return conditional_json(versions, build)
+
+
+def api_entity_detail(model, entity_id):
+    fields = api_fields(API_FIELDS[model] + API_SHOW_FIELDS)
+    counterpart = Artist if model is Venue else Venue
+    now = datetime.now()
+    validator = db.session.query(
+        model.version,
+        func.count(Show.id),
+        func.max(Show.id),
+        func.sum(case((Show.start_time < now, 1), else_=0)),
+        func.sum(counterpart.version)
+    ).outerjoin(Show, SHOW_KEYS[model] == model.id) \
+        .outerjoin(counterpart, SHOW_KEYS[counterpart] == counterpart.id) \
+        .filter(model.id == entity_id) \
+        .group_by(model.version).first()
+    if validator is None:
+        abort(404)
+
+    def build():
+        entity, past_shows, upcoming_shows, past_count, upcoming_count = \
+            load_show_timeline(model, counterpart, entity_id)
+        shows = {
+            'past_shows': past_shows,
+            'upcoming_shows': upcoming_shows,
+            'past_shows_count': past_count,
+            'upcoming_shows_count': upcoming_count,
+        }
+        body = {}
+        for field in fields:
+            if field in shows:
+                value = shows[field]
+                if isinstance(value, list):
+                    value = [{key: json_value(item) for key, item in show.items()} for show in value]
+                body[field] = value
+            else:
+                body[field] = json_value(getattr(entity, field))
+        return body
+
+    return conditional_json(tuple(validator), build)
+
+
+@app.route('/api/v1/venues')
+@read_only
+def api_venues():
+    return api_entity_list(Venue)
+
+
+@app.route('/api/v1/venues/<int:venue_id>')
+@read_only
+def api_venue(venue_id):
+    return api_entity_detail(Venue, venue_id)
+
+
+@app.route('/api/v1/artists')
+@read_only
+def api_artists():
+    return api_entity_list(Artist)
+
+
+@app.route('/api/v1/artists/<int:artist_id>')
+@read_only
+def api_artist(artist_id):
+    return api_entity_detail(Artist, artist_id)
+
+
+@app.route('/api/v1/shows')
+@read_only
+def api_shows():
+    fields = api_fields(API_FIELDS[Show])
+    limit = api_limit()
+    page = query_show_feed(decode_show_cursor(request.args.get('after'))).limit(limit)
+    # shows are never edited, so their ids plus the versions of the joined
+    # venues and artists identify the page
+    versions = page.with_entities(Show.id, Show.start_time, Venue.version, Artist.version).all()
+
+    def build():
+        rows = page.all()
+        return {
+            'data': [{field: json_value(getattr(row, field)) for field in fields} for row in rows],
+            'next': encode_show_cursor(rows[-1].start_time, rows[-1].id) if len(rows) == limit else None
+        }
+
+    return conditional_json(versions, build)
+
+
+@app.errorhandler(400)
+def bad_request_error(error):
+    if request.path.startswith('/api/'):
+        return jsonify({'success': False, 'error': 400, 'message': 'Bad request'}), 400
+    return error
 
 
 @app.errorhandler(404)
 def not_found_error(error):
+    if request.path.startswith('/api/'):
+        return jsonify({'success': False, 'error': 404, 'message': 'Resource not found'}), 404
     return render_template('errors/404.html'), 404
 
 
@@ -527,15 +1517,194 @@ def server_error(error):
 
 
 if not app.debug:
+    # handlers are served by a QueueListener thread, requests never wait on disk
     file_handler = FileHandler('error.log')
     file_handler.setFormatter(
         Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
     )
     app.logger.setLevel(logging.INFO)
     file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
+    start_queue_logging(app.logger, file_handler)
     app.logger.info('errors')
 
+    request_logger = logging.getLogger('fyyur.requests')
+    request_logger.setLevel(logging.INFO)
+    request_logger.propagate = False
+    start_queue_logging(request_logger, json_lines_handler(app.config.get('REQUEST_LOG', 'requests.log')))
+    init_request_timing(app, request_logger, app.config.get('SLOW_REQUEST_MS'))
+
+
+# ----------------------------------------------------------------------------#
+# CLI commands.
+# ----------------------------------------------------------------------------#
+
+IMPORT_TARGETS = {
+    'venues': (Venue, VenueForm),
+    'artists': (Artist, ArtistForm),
+    'shows': (Show, ShowForm),
+}
+
+
+@app.cli.command('import-data')
+@click.argument('kind', type=click.Choice(sorted(IMPORT_TARGETS)))
+@click.argument('source', type=click.File('r'))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']),
+              help='Input format, guessed from the file extension by default.')
+@click.option('--batch-size', default=1000, show_default=True,
+              help='Rows inserted and committed together.')
+@click.option('--rejects', type=click.File('w'),
+              help='Write rejected rows and their errors to this NDJSON file.')
+def import_data(kind, source, fmt, batch_size, rejects):
+    """Bulk load venues, artists or shows from a CSV or NDJSON file.
+
+    Rows are validated with the same forms as the create pages. In CSV
+    files, genres are separated by ';'. Import venues and artists before
+    the shows that reference them.
+    """
+    model, form_class = IMPORT_TARGETS[kind]
+    if fmt is None:
+        fmt = 'ndjson' if source.name.endswith(('.ndjson', '.jsonl')) else 'csv'
+
+    def progress(report):
+        click.echo('{}: {}'.format(kind, report.summary()))
+
+    # the forms need a request context to be built outside of a view
+    with app.test_request_context():
+        report = import_rows(db.session, model.__table__, form_class,
+                             read_rows(source, fmt), batch_size=batch_size,
+                             report=ImportReport(rejects), progress=progress)
+
+    # bulk inserts bypass the per-write refresh/eviction of the handlers
+    if kind == 'shows':
+        recompute_show_stats(Venue)
+        recompute_show_stats(Artist)
+        db.session.commit()
+    search_indexes.clear()
+    availability.clear()
+    matches.clear()
+    recent_activity.clear()
+    if page_cache is not None:
+        page_cache.clear()
+    click.echo('{} done: {}'.format(kind, report.summary()))
+
+
+@app.cli.command('roll-show-stats')
+def roll_show_stats_command():
+    """Move shows that have started from upcoming to past in the show counters.
+
+    Run it periodically, e.g. from cron.
+    """
+    rolled = roll_show_stats()
+    db.session.commit()
+    if rolled and page_cache is not None:
+        page_cache.clear()
+    click.echo('{} venues/artists updated'.format(rolled))
+
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Fingerprint and precompress static/ into static/dist (restart the app to pick it up)."""
+    manifest = build_assets(app.static_folder, progress=lambda path, built: click.echo(built))
+    click.echo('{} assets built'.format(len(manifest)))
+
+
+@app.cli.command('seed')
+@click.option('--venues', default=1000, show_default=True)
+@click.option('--artists', default=1000, show_default=True)
+@click.option('--shows', default=10000, show_default=True)
+@click.option('--batch-size', default=5000, show_default=True)
+@click.option('--seed', 'random_seed', default=0, show_default=True, help='Random seed.')
+def seed_command(venues, artists, shows, batch_size, random_seed):
+    """Fill the database with generated venues, artists and shows."""
+    started = time.perf_counter()
+
+    def progress(table, inserted):
+        click.echo('{}: {} rows'.format(table, inserted))
+
+    benchmark.seed_database(db.session, Venue.__table__, Artist.__table__, Show.__table__,
+                            venues=venues, artists=artists, shows=shows,
+                            batch_size=batch_size, seed=random_seed,
+                            duration=availability.duration, progress=progress)
+    recompute_show_stats(Venue)
+    recompute_show_stats(Artist)
+    db.session.commit()
+    search_indexes.clear()
+    availability.clear()
+    matches.clear()
+    recent_activity.clear()
+    if page_cache is not None:
+        page_cache.clear()
+    click.echo('seeded in {:.1f}s'.format(time.perf_counter() - started))
+
+
+def benchmark_routes():
+    """(name, method, make_request) for every read controller, ids sampled from the database"""
+    venue_ids = [row[0] for row in db.session.query(Venue.id).limit(10000)] or [1]
+    artist_ids = [row[0] for row in db.session.query(Artist.id).limit(10000)] or [1]
+    words = ['blue', 'hall', 'san', 'jazz', 'ny', 'moon']
+
+    def week(rng):
+        start = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=rng.randint(0, 60))
+        return 'start={}&end={}'.format(start.isoformat(), (start + timedelta(days=7)).isoformat())
+
+    return [
+        ('index', 'GET', lambda rng: ('/', None)),
+        ('venues', 'GET', lambda rng: ('/venues', None)),
+        ('venues_per_area', 'GET', lambda rng: ('/venues?per_area=10', None)),
+        ('show_venue', 'GET', lambda rng: ('/venues/{}'.format(rng.choice(venue_ids)), None)),
+        ('search_venues', 'POST', lambda rng: ('/venues/search', {'search_term': rng.choice(words)})),
+        ('artists', 'GET', lambda rng: ('/artists', None)),
+        ('show_artist', 'GET', lambda rng: ('/artists/{}'.format(rng.choice(artist_ids)), None)),
+        ('search_artists', 'POST', lambda rng: ('/artists/search', {'search_term': rng.choice(words)})),
+        ('shows', 'GET', lambda rng: ('/shows', None)),
+        ('genres', 'GET', lambda rng: ('/genres', None)),
+        ('venue_matches', 'GET', lambda rng: ('/venues/{}/matches'.format(rng.choice(venue_ids)), None)),
+        ('artist_matches', 'GET', lambda rng: ('/artists/{}/matches'.format(rng.choice(artist_ids)), None)),
+        ('venue_availability', 'GET',
+         lambda rng: ('/venues/{}/availability?{}'.format(rng.choice(venue_ids), week(rng)), None)),
+        ('artist_availability', 'GET',
+         lambda rng: ('/artists/{}/availability?{}'.format(rng.choice(artist_ids), week(rng)), None)),
+        ('create_venue_form', 'GET', lambda rng: ('/venues/create', None)),
+        ('create_artist_form', 'GET', lambda rng: ('/artists/create', None)),
+        ('create_show_form', 'GET', lambda rng: ('/shows/create', None)),
+        ('edit_venue_form', 'GET', lambda rng: ('/venues/{}/edit'.format(rng.choice(venue_ids)), None)),
+        ('edit_artist_form', 'GET', lambda rng: ('/artists/{}/edit'.format(rng.choice(artist_ids)), None)),
+        ('api_venues', 'GET', lambda rng: ('/api/v1/venues', None)),
+        ('api_venue', 'GET', lambda rng: ('/api/v1/venues/{}'.format(rng.choice(venue_ids)), None)),
+        ('api_artists', 'GET', lambda rng: ('/api/v1/artists', None)),
+        ('api_artist', 'GET', lambda rng: ('/api/v1/artists/{}'.format(rng.choice(artist_ids)), None)),
+        ('api_shows', 'GET', lambda rng: ('/api/v1/shows', None)),
+    ]
+
+
+@app.cli.command('benchmark')
+@click.option('--requests', 'requests_per_route', default=50, show_default=True,
+              help='Requests per route.')
+@click.option('--output', default='benchmark-{}.json'.format(datetime.now().strftime('%Y%m%d-%H%M%S')),
+              help='JSON file receiving the results.')
+@click.option('--route', 'only', multiple=True, help='Only run these routes (repeatable).')
+@click.option('--no-cache', is_flag=True, help='Bypass the page cache.')
+def benchmark_command(requests_per_route, output, only, no_cache):
+    """Measure latency percentiles, queries per request and peak RSS of every controller."""
+    global page_cache
+    if no_cache:
+        page_cache = None
+    routes = [route for route in benchmark_routes() if not only or route[0] in only]
+    results = benchmark.run_benchmark(app.test_client(), routes, requests_per_route)
+    report = benchmark.save_results(
+        output, results,
+        database=db.engine.dialect.name,
+        venues=db.session.query(func.count(Venue.id)).scalar(),
+        artists=db.session.query(func.count(Artist.id)).scalar(),
+        shows=db.session.query(func.count(Show.id)).scalar(),
+        page_cache=not no_cache and page_cache is not None,
+    )
+    for name, result in results.items():
+        click.echo('{:<16} p50 {:>8.2f}ms  p95 {:>8.2f}ms  p99 {:>8.2f}ms  {:>5.1f} queries'.format(
+            name, result['p50_ms'], result['p95_ms'], result['p99_ms'], result['queries_per_request']))
+    click.echo('peak RSS {}MB, results saved to {}'.format(report['peak_rss_mb'], output))
+
+
 # ----------------------------------------------------------------------------#
 # Launch.
 # ----------------------------------------------------------------------------#
@@ -0,0 +1,122 @@
+# ----------------------------------------------------------------------------#
+# Venue and artist availability.
+#
+# Every show occupies [start_time, start_time + duration). Since all
+# bookings have the same length, the schedule of a venue or artist is a
+# sorted array of start times: a conflict check is one bisect and a free
+# slot query is a bisect plus a walk over the bookings inside the window.
+# On Postgres the same rule is enforced by exclusion constraints on shows.
+# ----------------------------------------------------------------------------#
+
+import threading
+from bisect import bisect_right, insort
+from datetime import datetime, timezone
+
+
+def parse_naive(value):
+    """Parse an ISO datetime; one with an offset is converted to naive UTC
+
+    Show start times are stored without a time zone, and naive and aware
+    datetimes cannot be compared.
+    """
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+class Schedule:
+    """Sorted start times of the shows of one venue or artist"""
+
+    def __init__(self, duration, starts=()):
+        self.duration = duration
+        self.starts = sorted(starts)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def conflicts(self, start):
+        """True if a show starting at `start` overlaps a booked one"""
+        i = bisect_right(self.starts, start - self.duration)
+        return i < len(self.starts) and self.starts[i] < start + self.duration
+
+    def add(self, start):
+        insort(self.starts, start)
+
+    def free_slots(self, begin, end):
+        """Free periods between begin and end long enough for a show
+
+        Returns:
+            -list: (free_from, free_until) tuples, a show can start at any
+                   time in [free_from, free_until - duration]
+        """
+        slots = []
+        cursor = begin
+        i = bisect_right(self.starts, begin - self.duration)
+        while i < len(self.starts) and self.starts[i] < end:
+            booked = self.starts[i]
+            if booked - cursor >= self.duration:
+                slots.append((cursor, booked))
+            cursor = max(cursor, booked + self.duration)
+            i += 1
+        if end - cursor >= self.duration:
+            slots.append((cursor, end))
+        return slots
+
+
+class AvailabilityIndex:
+    """Schedules of venues and artists, loaded on first use.
+
+    Parameters:
+        -duration (timedelta): length of every show
+        -loader (function): loader(kind, entity_id) returns the start times of
+                            the shows of a 'venue' or an 'artist'
+    """
+
+    def __init__(self, duration, loader):
+        self.duration = duration
+        self.loader = loader
+        self.schedules = {}
+        self.lock = threading.Lock()
+
+    def schedule(self, kind, entity_id):
+        key = (kind, entity_id)
+        with self.lock:
+            schedule = self.schedules.get(key)
+        if schedule is None:
+            schedule = Schedule(self.duration, self.loader(kind, entity_id))
+            with self.lock:
+                schedule = self.schedules.setdefault(key, schedule)
+        return schedule
+
+    def conflicts(self, venue_id, artist_id, start):
+        """Which of 'venue' and 'artist' are already booked at `start`"""
+        booked = []
+        for kind, entity_id in (('venue', venue_id), ('artist', artist_id)):
+            schedule = self.schedule(kind, entity_id)
+            with self.lock:
+                if schedule.conflicts(start):
+                    booked.append(kind)
+        return booked
+
+    def book(self, venue_id, artist_id, start):
+        for kind, entity_id in (('venue', venue_id), ('artist', artist_id)):
+            with self.lock:
+                schedule = self.schedules.get((kind, entity_id))
+                if schedule is not None:
+                    schedule.add(start)
+
+    def free_slots(self, kind, entity_id, begin, end):
+        schedule = self.schedule(kind, entity_id)
+        with self.lock:
+            return schedule.free_slots(begin, end)
+
+    def forget(self, kind, *entity_ids):
+        """Drop schedules so they are reloaded, e.g. after a delete"""
+        with self.lock:
+            for entity_id in entity_ids:
+                self.schedules.pop((kind, entity_id), None)
+
+    def clear(self):
+        with self.lock:
+            self.schedules.clear()
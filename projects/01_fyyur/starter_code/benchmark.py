@@ -0,0 +1,215 @@
+# ----------------------------------------------------------------------------#
+# Synthetic data and benchmarks.
+#
+# seed_database fills venues, artists and shows with generated rows at any
+# scale; run_benchmark drives controllers through the Flask test client and
+# reports latency percentiles, queries per request and peak RSS.
+# ----------------------------------------------------------------------------#
+
+import json
+import random
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, select
+from sqlalchemy.engine import Engine
+
+AREAS = [
+    ('San Francisco', 'CA'), ('Los Angeles', 'CA'), ('San Diego', 'CA'), ('New York', 'NY'),
+    ('Brooklyn', 'NY'), ('Austin', 'TX'), ('Houston', 'TX'), ('Chicago', 'IL'),
+    ('Seattle', 'WA'), ('Portland', 'OR'), ('Denver', 'CO'), ('Nashville', 'TN'),
+    ('New Orleans', 'LA'), ('Atlanta', 'GA'), ('Boston', 'MA'), ('Miami', 'FL'),
+]
+GENRES = [
+    'Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk', 'Funk', 'Hip-Hop',
+    'Heavy Metal', 'Instrumental', 'Jazz', 'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae',
+    'Rock n Roll', 'Soul', 'Other',
+]
+NAME_WORDS = [
+    'Blue', 'Red', 'Golden', 'Velvet', 'Electric', 'Midnight', 'Silver', 'Wild', 'Lonely',
+    'Hidden', 'Royal', 'Broken', 'Neon', 'Crystal', 'Howling', 'Jazz', 'Moon', 'River',
+    'Stone', 'Echo', 'Fox', 'Rose', 'Thunder', 'Lantern', 'Harbor', 'Garden', 'Owl',
+]
+VENUE_SUFFIXES = ['Hall', 'Room', 'Club', 'Lounge', 'Theatre', 'Bar', 'House', 'Cellar']
+ARTIST_SUFFIXES = ['Band', 'Trio', 'Quartet', 'Collective', 'Orchestra', 'Project', 'Kids']
+
+
+def _name(rng, suffixes):
+    return '{} {} {}'.format(rng.choice(NAME_WORDS), rng.choice(NAME_WORDS), rng.choice(suffixes))
+
+
+def fake_venue(rng):
+    city, state = rng.choice(AREAS)
+    name = _name(rng, VENUE_SUFFIXES)
+    slug = name.lower().replace(' ', '')
+    return {
+        'name': name,
+        'city': city,
+        'state': state,
+        'address': '{} {} St'.format(rng.randint(1, 9999), rng.choice(NAME_WORDS)),
+        'phone': '{}-{}-{}'.format(rng.randint(200, 999), rng.randint(100, 999), rng.randint(1000, 9999)),
+        'genres': rng.sample(GENRES, rng.randint(1, 3)),
+        'website': 'https://www.{}.com'.format(slug),
+        'image_link': 'https://images.example.com/venues/{}.jpg'.format(slug),
+        'facebook_link': 'https://www.facebook.com/{}'.format(slug),
+        'seeking_talent': rng.random() < 0.3,
+        'seeking_description': 'Looking for local acts' if rng.random() < 0.3 else None,
+    }
+
+
+def fake_artist(rng):
+    city, state = rng.choice(AREAS)
+    name = _name(rng, ARTIST_SUFFIXES)
+    slug = name.lower().replace(' ', '')
+    return {
+        'name': name,
+        'city': city,
+        'state': state,
+        'phone': '{}-{}-{}'.format(rng.randint(200, 999), rng.randint(100, 999), rng.randint(1000, 9999)),
+        'genres': rng.sample(GENRES, rng.randint(1, 3)),
+        'website': 'https://www.{}.com'.format(slug),
+        'image_link': 'https://images.example.com/artists/{}.jpg'.format(slug),
+        'facebook_link': 'https://www.facebook.com/{}'.format(slug),
+        'seeking_venue': rng.random() < 0.3,
+        'seeking_description': 'Looking for gigs' if rng.random() < 0.3 else None,
+    }
+
+
+def _insert_in_batches(session, table, rows, batch_size, progress=None):
+    batch = []
+    inserted = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            session.execute(table.insert(), batch)
+            session.commit()
+            inserted += len(batch)
+            batch = []
+            if progress is not None:
+                progress(table.name, inserted)
+    if batch:
+        session.execute(table.insert(), batch)
+        session.commit()
+        inserted += len(batch)
+        if progress is not None:
+            progress(table.name, inserted)
+    return inserted
+
+
+def _show_rows(rng, venue_ids, artist_ids, shows, duration):
+    # starts are aligned on slots of `duration` and a venue or artist never
+    # gets the same slot twice, so no row violates the double booking rule
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    slots = int(timedelta(days=365) / duration)
+    booked = set()
+    for _ in range(shows):
+        for _ in range(10):
+            venue_id, artist_id = rng.choice(venue_ids), rng.choice(artist_ids)
+            slot = rng.randint(-slots, slots)
+            if ('venue', venue_id, slot) not in booked and ('artist', artist_id, slot) not in booked:
+                booked.add(('venue', venue_id, slot))
+                booked.add(('artist', artist_id, slot))
+                yield {'venue_id': venue_id, 'artist_id': artist_id,
+                       'start_time': now + slot * duration}
+                break
+
+
+def seed_database(session, venues_table, artists_table, shows_table, venues=1000, artists=1000,
+                  shows=10000, batch_size=5000, seed=0, duration=timedelta(hours=3), progress=None):
+    """Insert generated venues, artists and shows (shows spread over two years around now)"""
+    rng = random.Random(seed)
+    _insert_in_batches(session, venues_table, (fake_venue(rng) for _ in range(venues)),
+                       batch_size, progress)
+    _insert_in_batches(session, artists_table, (fake_artist(rng) for _ in range(artists)),
+                       batch_size, progress)
+
+    venue_ids = [row[0] for row in session.execute(select(venues_table.c.id))]
+    artist_ids = [row[0] for row in session.execute(select(artists_table.c.id))]
+    if not venue_ids or not artist_ids:
+        return
+    _insert_in_batches(session, shows_table, _show_rows(rng, venue_ids, artist_ids, shows, duration),
+                       batch_size, progress)
+
+
+@contextmanager
+def count_queries():
+    """Count the SQL statements executed inside the block: `with count_queries() as counter`"""
+    counter = {'queries': 0}
+
+    def after_execute(conn, cursor, statement, parameters, context, executemany):
+        counter['queries'] += 1
+
+    event.listen(Engine, 'after_cursor_execute', after_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(Engine, 'after_cursor_execute', after_execute)
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(p / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024.0 * 1024.0) if sys.platform == 'darwin' else peak / 1024.0
+
+
+def run_benchmark(client, routes, requests_per_route=50, seed=0):
+    """Time every route through the test client
+
+    Parameters:
+        -routes (list): (name, method, make_request) where make_request(rng)
+                        returns (url, form_data)
+
+    Returns:
+        -dict: per route latency percentiles (ms), mean queries and status codes
+
+    Every request runs in an app context of its own, as it would when served:
+    the CLI's context would otherwise hand all of them the same g and
+    db.session, so a failed query aborts the transaction of every later
+    request and the session keeps every object loaded by the earlier routes.
+    """
+    app = client.application
+    rng = random.Random(seed)
+    results = {}
+    for name, method, make_request in routes:
+        timings = []
+        queries = []
+        statuses = {}
+        for _ in range(requests_per_route):
+            url, data = make_request(rng)
+            with app.app_context(), count_queries() as counter:
+                started = time.perf_counter()
+                response = client.open(url, method=method, data=data)
+                response.get_data()  # consume streamed bodies
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(counter['queries'])
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        timings.sort()
+        results[name] = {
+            'requests': requests_per_route,
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'queries_per_request': round(sum(queries) / float(len(queries)), 2),
+            'status_codes': {str(code): count for code, count in sorted(statuses.items())},
+        }
+    return results
+
+
+def save_results(path, results, **metadata):
+    report = dict(metadata)
+    report['created_at'] = datetime.now().isoformat()
+    report['peak_rss_mb'] = round(peak_rss_mb(), 1)
+    report['routes'] = results
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    return report
@@ -0,0 +1,145 @@
+# ----------------------------------------------------------------------------#
+# Bulk import of venues, artists and shows.
+#
+# Rows are streamed from CSV or NDJSON, validated with the same WTForms
+# used by the create pages, and inserted with one executemany per batch.
+# ----------------------------------------------------------------------------#
+
+import csv
+import json
+import time
+
+from sqlalchemy import Boolean, Integer
+from sqlalchemy.exc import SQLAlchemyError
+from werkzeug.datastructures import MultiDict
+
+# separator of list values (genres) inside a CSV cell
+CSV_LIST_SEPARATOR = ';'
+
+
+def read_rows(stream, fmt='csv'):
+    """Yield one dict per input row, without loading the whole file"""
+    if fmt == 'ndjson':
+        for line in stream:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+    else:
+        for row in csv.DictReader(stream):
+            yield row
+
+
+def to_formdata(row, list_fields=('genres',)):
+    formdata = MultiDict()
+    for name, value in row.items():
+        if value is None:
+            continue
+        if name in list_fields and isinstance(value, str):
+            value = [item.strip() for item in value.split(CSV_LIST_SEPARATOR) if item.strip()]
+        if isinstance(value, list):
+            for item in value:
+                formdata.add(name, str(item))
+        else:
+            formdata.add(name, str(value))
+    return formdata
+
+
+def validate_row(form_class, table, row):
+    """Validate a row with form_class and map it onto the table columns
+
+    Returns:
+        -tuple: (values, None) for a valid row, (None, errors) otherwise
+    """
+    form = form_class(formdata=to_formdata(row), meta={'csrf': False})
+    if not form.validate():
+        return None, form.errors
+    values = {}
+    try:
+        for column in table.columns:
+            if column.primary_key or column.name not in form:
+                continue
+            value = form[column.name].data
+            if isinstance(column.type, Boolean):
+                value = bool(int(value or 0))
+            elif isinstance(column.type, Integer):
+                value = int(value)
+            values[column.name] = value
+    except (TypeError, ValueError) as e:
+        return None, {'row': [str(e)]}
+    return values, None
+
+
+class ImportReport:
+    """Counts rows and writes rejected rows (with their errors) as NDJSON"""
+
+    def __init__(self, rejects=None):
+        self.rejects = rejects
+        self.inserted = 0
+        self.rejected = 0
+        self.started = time.monotonic()
+
+    def reject(self, row, errors):
+        self.rejected += 1
+        if self.rejects is not None:
+            self.rejects.write(json.dumps({'row': row, 'errors': errors}, default=str) + '\n')
+
+    @property
+    def rows_per_second(self):
+        elapsed = time.monotonic() - self.started
+        return (self.inserted + self.rejected) / elapsed if elapsed else 0.0
+
+    def summary(self):
+        return '{} inserted, {} rejected, {:.0f} rows/s'.format(
+            self.inserted, self.rejected, self.rows_per_second)
+
+
+def insert_batch(session, table, batch, report):
+    """Insert a batch with one executemany and commit it.
+
+    If the batch fails (e.g. a show pointing at a missing venue), it is
+    retried row by row so that only the offending rows are rejected.
+    """
+    if not batch:
+        return
+    try:
+        session.execute(table.insert(), [values for _, values in batch])
+        session.commit()
+        report.inserted += len(batch)
+        return
+    except SQLAlchemyError:
+        session.rollback()
+
+    for row, values in batch:
+        try:
+            session.execute(table.insert(), [values])
+            session.commit()
+            report.inserted += 1
+        except SQLAlchemyError as e:
+            session.rollback()
+            report.reject(row, {'database': [str(e.orig if hasattr(e, 'orig') else e)]})
+
+
+def import_rows(session, table, form_class, rows, batch_size=1000, report=None, progress=None):
+    """Validate and insert rows in batches of batch_size (one commit per batch)
+
+    Parameters:
+        -progress: optional callable(report), called after every batch
+
+    Returns:
+        -ImportReport
+    """
+    report = report or ImportReport()
+    batch = []
+    for row in rows:
+        values, errors = validate_row(form_class, table, row)
+        if errors:
+            report.reject(row, errors)
+            continue
+        batch.append((row, values))
+        if len(batch) >= batch_size:
+            insert_batch(session, table, batch, report)
+            batch = []
+            if progress is not None:
+                progress(report)
+    insert_batch(session, table, batch, report)
+    return report
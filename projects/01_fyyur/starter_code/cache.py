@@ -0,0 +1,121 @@
+# ----------------------------------------------------------------------------#
+# Page cache.
+#
+# Rendered pages are stored under a key and a group. A group is what a
+# write invalidates, e.g. ('show_venue', 3) holds every cached variant of
+# the page of venue 3.
+# ----------------------------------------------------------------------------#
+
+import hashlib
+import os
+import pickle
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """In-process least-recently-used cache with a time to live"""
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (expires, group, value)
+        self.groups = {}  # group -> set of keys
+        self.lock = threading.Lock()
+
+    def get(self, key, group=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, group, value = entry
+            if expires < time.monotonic():
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, group=None):
+        with self.lock:
+            self._remove(key)
+            self.entries[key] = (time.monotonic() + self.ttl, group, value)
+            self.groups.setdefault(group, set()).add(key)
+            while len(self.entries) > self.maxsize:
+                self._remove(next(iter(self.entries)))
+
+    def evict(self, group):
+        with self.lock:
+            for key in list(self.groups.get(group, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.groups.clear()
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self.groups.get(entry[1])
+        keys.discard(key)
+        if not keys:
+            del self.groups[entry[1]]
+
+
+class DiskCache:
+    """Cache stored as one file per key, in one directory per group.
+
+    Survives restarts and is shared by every worker process using the
+    same directory.
+    """
+
+    def __init__(self, directory, ttl=300):
+        self.directory = directory
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def _digest(value):
+        return hashlib.sha1(repr(value).encode('utf-8')).hexdigest()
+
+    def _path(self, key, group):
+        return os.path.join(self.directory, self._digest(group), self._digest(key))
+
+    def get(self, key, group=None):
+        try:
+            with open(self._path(key, group), 'rb') as f:
+                expires, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires < time.time():
+            return None
+        return value
+
+    def set(self, key, value, group=None):
+        path = self._path(key, group)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = '{}.{}.tmp'.format(path, threading.get_ident())
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((time.time() + self.ttl, value), f)
+        os.replace(tmp_path, path)
+
+    def evict(self, group):
+        shutil.rmtree(os.path.join(self.directory, self._digest(group)), ignore_errors=True)
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(self.directory, exist_ok=True)
+
+
+def make_cache(config):
+    """Build the page cache selected by PAGE_CACHE ('memory', 'disk' or None)"""
+    backend = config.get('PAGE_CACHE')
+    ttl = config.get('PAGE_CACHE_TTL', 300)
+    if backend == 'memory':
+        return LRUCache(maxsize=config.get('PAGE_CACHE_SIZE', 1024), ttl=ttl)
+    if backend == 'disk':
+        return DiskCache(config['PAGE_CACHE_DIR'], ttl=ttl)
+    return None
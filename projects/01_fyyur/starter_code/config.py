@@ -10,5 +10,59 @@ DEBUG = True
 
 
 # TODO IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = 'postgresql://hlin@localhost:5432/fyyur'
-SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'postgresql://hlin@localhost:5432/fyyur')
+SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# Connection pool, applied to the primary and to every replica
+SQLALCHEMY_ENGINE_OPTIONS = {
+    'pool_size': 10,
+    'max_overflow': 20,
+    'pool_pre_ping': True,   # drop connections the server has closed
+    'pool_recycle': 1800,    # seconds
+}
+
+# Read replicas for the read-only controllers, e.g.
+# ['postgresql://hlin@replica-1:5432/fyyur']. Writes always go to the primary.
+SQLALCHEMY_REPLICA_URIS = []
+SQLALCHEMY_BINDS = {'replica_{}'.format(i): uri for i, uri in enumerate(SQLALCHEMY_REPLICA_URIS)}
+# Seconds a browser reads from the primary after a write, so it sees its own
+# changes however far behind the replicas are
+READ_YOUR_WRITES_SECONDS = 10
+
+# Listing pages
+# Max venues shown per city on /venues, None lists every venue
+VENUES_PER_AREA = None
+
+# Shows per page on /shows, and whether the feed is streamed by default
+SHOWS_PER_PAGE = 30
+SHOWS_STREAM = False
+
+# Max results listed by venue/artist search
+SEARCH_RESULT_LIMIT = 50
+# Venue/artist search: 'pg_trgm' (ILIKE on the trigram GIN indexes) or
+# 'memory' (n-gram index held in each process, no query per search)
+SEARCH_BACKEND = 'pg_trgm'
+
+# Rendered page cache: 'memory' (LRU), 'disk' or None to disable
+PAGE_CACHE = 'memory'
+PAGE_CACHE_SIZE = 1024
+PAGE_CACHE_TTL = 300  # seconds
+PAGE_CACHE_DIR = os.path.join(basedir, '.page_cache')
+
+# JSON API page sizes (?limit=)
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 500
+
+# Length of every show, used for double-booking checks and free slots.
+# Keep in sync with the shows exclusion constraints (migration 7b0d3f86e1a2).
+SHOW_DURATION_HOURS = 3
+
+# Venues, artists and shows listed under recent activity on the home page
+RECENT_ACTIVITY_SIZE = 10
+
+# Most matches returned by /venues/<id>/matches and /artists/<id>/matches (?limit=)
+MATCH_LIMIT = 50
+
+# Per-request timing records (JSON lines), written when DEBUG is off
+REQUEST_LOG = os.path.join(basedir, 'requests.log')
+SLOW_REQUEST_MS = 500  # also logged as a warning to error.log
@@ -0,0 +1,95 @@
+# ----------------------------------------------------------------------------#
+# Read replica routing.
+#
+# Replicas are declared as SQLALCHEMY_BINDS named replica_<n> (see
+# config.py). Controllers decorated with @read_only run their queries on a
+# replica picked at random once per request, so that e.g. the ETag and the
+# body of a response are read at the same replication lag; everything else,
+# and any write or flush, uses the primary database.
+#
+# Replicas lag behind the primary, so a browser that has just written
+# (e.g. created a venue and got redirected to it) reads from the primary
+# for READ_YOUR_WRITES_SECONDS afterwards, remembered in its session.
+# ----------------------------------------------------------------------------#
+
+import random
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import current_app, g, has_app_context, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.dml import UpdateBase
+
+REPLICA_PREFIX = 'replica_'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+WROTE_AT = 'wrote_at'
+
+
+def has_replicas(app):
+    return any(key and key.startswith(REPLICA_PREFIX) for key in app.config.get('SQLALCHEMY_BINDS') or {})
+
+
+def wrote_recently():
+    """True if this browser made a write less than READ_YOUR_WRITES_SECONDS ago"""
+    if not has_request_context():
+        return False
+    wrote_at = session.get(WROTE_AT)
+    return wrote_at is not None and \
+        time.time() - wrote_at < current_app.config.get('READ_YOUR_WRITES_SECONDS', 10)
+
+
+def init_read_your_writes(app):
+    """Remember in the session when a browser last wrote, if replicas are configured"""
+    if not has_replicas(app):
+        return
+
+    @app.after_request
+    def remember_write(response):
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            session[WROTE_AT] = time.time()
+        return response
+
+
+def read_only(view):
+    """Send the queries of a view to a read replica, when one is configured"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.use_replica = not wrote_recently()
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@contextmanager
+def use_primary():
+    """Force the primary, inside a @read_only view (e.g. to fill a process-wide
+    index) or around one (e.g. to render a page that goes into a shared cache)"""
+    previous = g.get('primary_only', False) if has_app_context() else False
+    if has_app_context():
+        g.primary_only = True
+    try:
+        yield
+    finally:
+        if has_app_context():
+            g.primary_only = previous
+
+
+class RoutingSession(Session):
+    """Session picking a replica engine for reads made by @read_only views"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._use_replica(clause):
+            replica = g.get('replica')
+            if replica is None:
+                replicas = [key for key in self._db.engines
+                            if key and key.startswith(REPLICA_PREFIX)]
+                if not replicas:
+                    return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+                replica = g.replica = random.choice(replicas)
+            return self._db.engines[replica]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _use_replica(self, clause):
+        if self._flushing or isinstance(clause, UpdateBase):
+            return False
+        return has_app_context() and g.get('use_replica', False) and not g.get('primary_only', False)
@@ -0,0 +1,140 @@
+# ----------------------------------------------------------------------------#
+# Artist / venue matchmaking.
+#
+# Venues seeking talent and artists seeking a venue are kept in inverted
+# indexes, genre -> ids and state -> ids, per side. Matching an entity only
+# scores the candidates sharing one of its genres or its state, instead of
+# comparing it against every row of the other table. The indexes are
+# loaded on first use and refreshed entity by entity after writes.
+# ----------------------------------------------------------------------------#
+
+import heapq
+import threading
+
+GENRE_WEIGHT = 0.6
+CITY_WEIGHT = 0.25
+STATE_WEIGHT = 0.1
+HISTORY_WEIGHT = 0.15
+# past shows together after which the history bonus stops growing
+HISTORY_CAP = 3
+
+
+class SeekingSide:
+    """Seeking venues or artists, indexed by genre and by state"""
+
+    def __init__(self):
+        self.entries = {}
+        self.by_genre = {}
+        self.by_state = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, entity_id, genres, city, state):
+        self.remove(entity_id)
+        genres = frozenset(genres or ())
+        self.entries[entity_id] = (genres, city, state)
+        for genre in genres:
+            self.by_genre.setdefault(genre, set()).add(entity_id)
+        self.by_state.setdefault(state, set()).add(entity_id)
+
+    def remove(self, entity_id):
+        entry = self.entries.pop(entity_id, None)
+        if entry is None:
+            return
+        genres, city, state = entry
+        for key, index in [(genre, self.by_genre) for genre in genres] + [(state, self.by_state)]:
+            ids = index.get(key)
+            if ids is not None:
+                ids.discard(entity_id)
+                if not ids:
+                    del index[key]
+
+    def candidates(self, genres, state):
+        ids = set(self.by_state.get(state, ()))
+        for genre in genres:
+            ids |= self.by_genre.get(genre, set())
+        return ids
+
+
+def match_score(genres, city, state, candidate, shows_together=0):
+    """Score in [0, 1] of a candidate (genres, city, state) for an entity
+
+    Genre overlap is the Jaccard index of the two genre sets; the same city
+    beats the same state; every past show together adds a bonus.
+    """
+    candidate_genres, candidate_city, candidate_state = candidate
+    union = genres | candidate_genres
+    score = GENRE_WEIGHT * len(genres & candidate_genres) / len(union) if union else 0.0
+    if state == candidate_state:
+        score += CITY_WEIGHT if city == candidate_city else STATE_WEIGHT
+    score += HISTORY_WEIGHT * min(shows_together, HISTORY_CAP) / HISTORY_CAP
+    return score
+
+
+class MatchIndex:
+    """Seeking venues and artists, loaded on first use.
+
+    Parameters:
+        -loader (function): loader(kind, entity_ids=None) returns
+                            (id, genres, city, state) rows of the seeking
+                            'venue' or 'artist' entities, all of them when
+                            entity_ids is None
+    """
+
+    def __init__(self, loader):
+        self.loader = loader
+        self.sides = {}
+        self.lock = threading.Lock()
+
+    def side(self, kind):
+        with self.lock:
+            side = self.sides.get(kind)
+        if side is None:
+            side = SeekingSide()
+            for entity_id, genres, city, state in self.loader(kind):
+                side.add(entity_id, genres, city, state)
+            with self.lock:
+                side = self.sides.setdefault(kind, side)
+        return side
+
+    def match(self, kind, genres, city, state, history=None, limit=10):
+        """Best seeking entities of kind for an entity with genres, city and state
+
+        Parameters:
+            -history (dict): candidate id -> number of past shows together;
+                             candidates with a history are always scored
+
+        Returns:
+            -list: (score, id, shared genres) tuples, best match first
+        """
+        genres = frozenset(genres or ())
+        history = history or {}
+        side = self.side(kind)
+        with self.lock:
+            ids = side.candidates(genres, state) | (set(history) & set(side.entries))
+            scored = []
+            for entity_id in ids:
+                candidate = side.entries[entity_id]
+                score = match_score(genres, city, state, candidate, history.get(entity_id, 0))
+                scored.append((score, -entity_id, sorted(genres & candidate[0])))
+        best = heapq.nlargest(limit, scored)
+        return [(round(score, 4), -negated_id, shared) for score, negated_id, shared in best if score > 0]
+
+    def refresh(self, kind, *entity_ids):
+        """Re-read (or drop) entities after a write, if the side is loaded"""
+        with self.lock:
+            loaded = kind in self.sides
+        if not loaded or not entity_ids:
+            return
+        rows = list(self.loader(kind, entity_ids))
+        with self.lock:
+            side = self.sides[kind]
+            for entity_id in entity_ids:
+                side.remove(entity_id)
+            for entity_id, genres, city, state in rows:
+                side.add(entity_id, genres, city, state)
+
+    def clear(self):
+        with self.lock:
+            self.sides.clear()
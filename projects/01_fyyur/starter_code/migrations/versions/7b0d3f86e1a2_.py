@@ -0,0 +1,40 @@
+"""prevent double booking of venues and artists
+
+Revision ID: 7b0d3f86e1a2
+Revises: e19a7c44b2d8
+Create Date: 2026-10-18 15:05:31.120448
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b0d3f86e1a2'
+down_revision = 'e19a7c44b2d8'
+branch_labels = None
+depends_on = None
+
+# must match SHOW_DURATION_HOURS in config.py
+SHOW_DURATION = "interval '3 hours'"
+
+
+def upgrade():
+    op.create_index('ix_shows_venue_id_start_time', 'shows', ['venue_id', 'start_time'])
+    op.create_index('ix_shows_artist_id_start_time', 'shows', ['artist_id', 'start_time'])
+
+    # btree_gist provides the "=" operator class for integers in a GiST index.
+    # Fails if existing shows already overlap; fix those rows first.
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    for column in ('venue_id', 'artist_id'):
+        op.execute(
+            'ALTER TABLE shows ADD CONSTRAINT shows_{0}_no_overlap EXCLUDE USING gist '
+            '({0} WITH =, tsrange(start_time, start_time + {1}) WITH &&)'.format(column, SHOW_DURATION)
+        )
+
+
+def downgrade():
+    op.drop_constraint('shows_artist_id_no_overlap', 'shows')
+    op.drop_constraint('shows_venue_id_no_overlap', 'shows')
+    op.drop_index('ix_shows_artist_id_start_time', table_name='shows')
+    op.drop_index('ix_shows_venue_id_start_time', table_name='shows')
@@ -0,0 +1,54 @@
+"""per venue and per artist show counters
+
+Revision ID: 91f4c6d2a8b5
+Revises: 7b0d3f86e1a2
+Create Date: 2026-10-18 16:48:22.038517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '91f4c6d2a8b5'
+down_revision = '7b0d3f86e1a2'
+branch_labels = None
+depends_on = None
+
+STATS_TABLES = (
+    ('venue_show_stats', 'venue_id', 'venues'),
+    ('artist_show_stats', 'artist_id', 'artists'),
+)
+
+
+def upgrade():
+    for table, key, parent in STATS_TABLES:
+        op.create_table(table,
+        sa.Column(key, sa.Integer(), nullable=False),
+        sa.Column('total_shows', sa.Integer(), nullable=False),
+        sa.Column('upcoming_shows', sa.Integer(), nullable=False),
+        sa.Column('next_show_at', sa.DateTime(), nullable=True),
+        sa.Column('last_show_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint([key], [parent + '.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint(key)
+        )
+        op.create_index(op.f('ix_{}_total_shows'.format(table)), table, ['total_shows'])
+        op.create_index(op.f('ix_{}_next_show_at'.format(table)), table, ['next_show_at'])
+
+        # backfill from the existing shows
+        op.execute(
+            'INSERT INTO {table} ({key}, total_shows, upcoming_shows, next_show_at, last_show_at) '
+            'SELECT p.id, count(s.id), '
+            'count(s.id) FILTER (WHERE s.start_time >= LOCALTIMESTAMP), '
+            'min(s.start_time) FILTER (WHERE s.start_time >= LOCALTIMESTAMP), '
+            'max(s.start_time) FILTER (WHERE s.start_time < LOCALTIMESTAMP) '
+            'FROM {parent} p LEFT JOIN shows s ON s.{key} = p.id '
+            'GROUP BY p.id'.format(table=table, key=key, parent=parent)
+        )
+
+
+def downgrade():
+    for table, key, parent in reversed(STATS_TABLES):
+        op.drop_index(op.f('ix_{}_next_show_at'.format(table)), table_name=table)
+        op.drop_index(op.f('ix_{}_total_shows'.format(table)), table_name=table)
+        op.drop_table(table)
@@ -0,0 +1,37 @@
+"""trigram search indexes on venue and artist name, city and state
+
+Revision ID: a83d5e60c1f4
+Revises: 4f1c2a9b7d3e
+Create Date: 2026-10-18 10:02:17.284630
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a83d5e60c1f4'
+down_revision = '4f1c2a9b7d3e'
+branch_labels = None
+depends_on = None
+
+SEARCH_COLUMNS = {
+    'venues': ('name', 'city', 'state'),
+    'artists': ('name', 'city', 'state'),
+}
+
+
+def upgrade():
+    # pg_trgm lets GIN indexes answer ILIKE '%term%' and similarity()
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table, columns in SEARCH_COLUMNS.items():
+        for column in columns:
+            op.create_index('ix_{}_{}_trgm'.format(table, column), table, [column],
+                            postgresql_using='gin',
+                            postgresql_ops={column: 'gin_trgm_ops'})
+
+
+def downgrade():
+    for table, columns in SEARCH_COLUMNS.items():
+        for column in columns:
+            op.drop_index('ix_{}_{}_trgm'.format(table, column), table_name=table)
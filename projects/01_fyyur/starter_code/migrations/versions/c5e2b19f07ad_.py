@@ -0,0 +1,27 @@
+"""GIN indexes on venue and artist genres
+
+Revision ID: c5e2b19f07ad
+Revises: a83d5e60c1f4
+Create Date: 2026-10-18 11:24:55.917302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e2b19f07ad'
+down_revision = 'a83d5e60c1f4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # serves genres @> ARRAY[...] filters
+    op.create_index('ix_venues_genres', 'venues', ['genres'], postgresql_using='gin')
+    op.create_index('ix_artists_genres', 'artists', ['genres'], postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_artists_genres', table_name='artists')
+    op.drop_index('ix_venues_genres', table_name='venues')
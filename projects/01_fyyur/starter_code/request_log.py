@@ -0,0 +1,83 @@
+# ----------------------------------------------------------------------------#
+# Non-blocking logging and per-request timing.
+#
+# Request threads only put log records on a queue; a QueueListener thread
+# does the file I/O. Every request also produces one JSON line with its
+# route, status, total time, time spent in the database and query count.
+# ----------------------------------------------------------------------------#
+
+import atexit
+import json
+import logging
+import time
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from queue import Queue
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+def start_queue_logging(logger, *handlers):
+    """Route logger through a queue to handlers served by a background thread"""
+    queue = Queue(-1)
+    logger.addHandler(QueueHandler(queue))
+    listener = QueueListener(queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'request_started' in g:
+        g.query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'query_started' in g:
+        g.db_time += time.perf_counter() - g.pop('query_started')
+        g.query_count += 1
+
+
+def init_request_timing(app, logger, slow_request_ms=None):
+    """Log a JSON timing record for every request of app to logger
+
+    Requests slower than slow_request_ms are also logged as a warning on
+    app.logger.
+    """
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+        g.db_time = 0.0
+        g.query_count = 0
+
+    @app.after_request
+    def log_timing(response):
+        if 'request_started' not in g:
+            return response
+        total_ms = (time.perf_counter() - g.request_started) * 1000
+        record = {
+            'time': datetime.utcnow().isoformat(),
+            'method': request.method,
+            'route': request.url_rule.rule if request.url_rule else request.path,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 2),
+            'db_ms': round(g.db_time * 1000, 2),
+            'queries': g.query_count,
+        }
+        logger.info(json.dumps(record))
+        if slow_request_ms is not None and total_ms > slow_request_ms:
+            app.logger.warning('slow request: %s %s took %.0fms',
+                               request.method, request.path, total_ms)
+        return response
+
+
+def json_lines_handler(path):
+    handler = logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    handler.setLevel(logging.INFO)
+    return handler
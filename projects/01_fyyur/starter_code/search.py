@@ -0,0 +1,117 @@
+# ----------------------------------------------------------------------------#
+# In-process n-gram search index.
+#
+# Postgres answers venue/artist searches with pg_trgm GIN indexes (see the
+# migrations). With SEARCH_BACKEND = 'memory' (config.py), or on another
+# database, searches use this index instead: an inverted index from n-gram
+# to document ids, so a search only touches the posting lists of the
+# n-grams in the search term, without a query.
+# ----------------------------------------------------------------------------#
+
+import threading
+
+NGRAM_SIZE = 3
+
+
+def ngrams(text, size=NGRAM_SIZE):
+    """All substrings of length 1..size of a lowercased text"""
+    text = text.lower()
+    grams = set()
+    for n in range(1, size + 1):
+        grams.update(text[i:i + n] for i in range(len(text) - n + 1))
+    return grams
+
+
+def trigrams(word):
+    """pg_trgm style trigrams of a word, used for ranking"""
+    padded = '  ' + word.lower() + ' '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a, b):
+    """Same measure as pg_trgm's similarity(): shared / total trigrams"""
+    grams_a, grams_b = trigrams(a), trigrams(b)
+    if not grams_a or not grams_b:
+        return 0.0
+    return len(grams_a & grams_b) / len(grams_a | grams_b)
+
+
+class NgramIndex:
+    """Inverted n-gram index over a few text fields per document.
+
+    A document matches when the search term is a substring of one of its
+    fields (the same semantics as ILIKE '%term%'). Candidates are found by
+    intersecting posting lists, smallest first, then checked and ranked.
+    Writes after a venue/artist edit may come from other request threads
+    than searches, so every method holds the index lock.
+    """
+
+    def __init__(self, size=NGRAM_SIZE):
+        self.size = size
+        self.postings = {}
+        self.documents = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add(self, doc_id, fields):
+        """Index (or re-index) a document given as a sequence of strings"""
+        with self.lock:
+            self._remove(doc_id)
+            self._add(doc_id, fields)
+
+    def remove(self, doc_id):
+        with self.lock:
+            self._remove(doc_id)
+
+    def _add(self, doc_id, fields):
+        fields = tuple(field or '' for field in fields)
+        self.documents[doc_id] = fields
+        for gram in ngrams('\n'.join(fields), self.size):
+            self.postings.setdefault(gram, set()).add(doc_id)
+
+    def _remove(self, doc_id):
+        fields = self.documents.pop(doc_id, None)
+        if fields is None:
+            return
+        for gram in ngrams('\n'.join(fields), self.size):
+            posting = self.postings.get(gram)
+            if posting is not None:
+                posting.discard(doc_id)
+                if not posting:
+                    del self.postings[gram]
+
+    def candidates(self, term):
+        grams = ngrams(term, self.size)
+        grams = {gram for gram in grams if len(gram) == min(len(term), self.size)}
+        postings = sorted((self.postings.get(gram, set()) for gram in grams), key=len)
+        if not postings:
+            return set(self.documents)
+        result = set(postings[0])
+        for posting in postings[1:]:
+            result &= posting
+            if not result:
+                break
+        return result
+
+    def search(self, term, limit=None):
+        """Ids of the documents containing term, best match first
+
+        Returns:
+            -tuple: (ids, total) where total counts every match before the limit
+        """
+        term = term.lower()
+        scored = []
+        with self.lock:
+            for doc_id in self.candidates(term):
+                fields = self.documents[doc_id]
+                if not any(term in field.lower() for field in fields):
+                    continue
+                score = max(similarity(term, field) for field in fields) if term else 0.0
+                scored.append((-score, doc_id))
+        scored.sort()
+        ids = [doc_id for _, doc_id in scored]
+        if limit is not None:
+            ids = ids[:limit]
+        return ids, len(scored)
@@ -0,0 +1,162 @@
+# ----------------------------------------------------------------------------#
+# Fingerprinted, precompressed static assets.
+#
+# "flask build-assets" copies every file of static/ to static/dist/ under a
+# name carrying a hash of its content (css/main.3f2a9c1b7d04.css), writes
+# .gz and .br siblings for text files and records original -> fingerprinted
+# names in static/dist/manifest.json. url_for('static', ...) then links the
+# fingerprinted file, which never changes and is served with
+# "Cache-Control: immutable" and the best encoding the browser accepts.
+# Without a manifest (development) static files are served as usual.
+# ----------------------------------------------------------------------------#
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+
+from flask import request, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, .br files are simply not built
+    brotli = None
+
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+HASH_LENGTH = 12
+# files worth compressing; images and fonts other than svg are already compressed
+COMPRESSIBLE = ('.css', '.js', '.map', '.svg', '.html', '.txt', '.json', '.eot', '.ttf', '.otf')
+# (suffix, Content-Encoding, Accept-Encoding token), in order of preference
+ENCODINGS = [('.br', 'br', 'br'), ('.gz', 'gzip', 'gzip')]
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+
+def fingerprint(path, content):
+    digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+    root, ext = posixpath.splitext(path)
+    return '{}.{}{}'.format(root, digest, ext)
+
+
+def _rewrite_css_urls(path, content, manifest):
+    # point url(...) references of a stylesheet at the fingerprinted files
+    def replace(match):
+        quote, url = match.group(1), match.group(2)
+        if url.startswith(('data:', 'http:', 'https:', '//', '/')):
+            return match.group(0)
+        target, suffix = re.match(r'([^?#]*)(.*)', url).groups()
+        resolved = posixpath.normpath(posixpath.join(posixpath.dirname(path), target))
+        if resolved not in manifest:
+            return match.group(0)
+        # relative to where the stylesheet is written: dist/css/, not css/
+        relative = posixpath.relpath(manifest[resolved], posixpath.dirname(posixpath.join(DIST_DIR, path)))
+        return 'url({0}{1}{2}{0})'.format(quote, relative, suffix)
+
+    return CSS_URL.sub(replace, content.decode('utf-8')).encode('utf-8')
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+
+
+def _compress(path, content):
+    if not path.endswith(COMPRESSIBLE):
+        return
+    compressed = gzip.compress(content, compresslevel=9, mtime=0)
+    if len(compressed) < len(content):
+        _write(path + '.gz', compressed)
+    if brotli is not None:
+        compressed = brotli.compress(content, quality=11)
+        if len(compressed) < len(content):
+            _write(path + '.br', compressed)
+
+
+def build_assets(static_folder, progress=None):
+    """Fingerprint and precompress every file of static_folder into static_folder/dist
+
+    Stylesheets are processed last so their url(...) references can be
+    rewritten to the fingerprinted fonts and images.
+
+    Returns:
+        -dict: manifest, original path -> fingerprinted path (both relative
+               to static_folder)
+    """
+    dist = os.path.join(static_folder, DIST_DIR)
+    if os.path.isdir(dist):
+        shutil.rmtree(dist)
+
+    sources = []
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != dist)
+        for name in sorted(files):
+            if not name.startswith('.'):
+                sources.append(os.path.relpath(os.path.join(root, name), static_folder).replace(os.sep, '/'))
+    sources.sort(key=lambda path: path.endswith('.css'))
+
+    manifest = {}
+    for path in sources:
+        with open(os.path.join(static_folder, path), 'rb') as f:
+            content = f.read()
+        if path.endswith('.css'):
+            content = _rewrite_css_urls(path, content, manifest)
+        built = posixpath.join(DIST_DIR, fingerprint(path, content))
+        target = os.path.join(static_folder, built)
+        _write(target, content)
+        _compress(target, content)
+        manifest[path] = built
+        if progress is not None:
+            progress(path, built)
+
+    with open(os.path.join(dist, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST_DIR, MANIFEST)) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+
+def init_static_assets(app):
+    """Make url_for('static', ...) link fingerprinted files and serve them precompressed"""
+    static_folder = app.static_folder
+    manifest = load_manifest(static_folder)
+    app.config['STATIC_MANIFEST'] = manifest
+    if not manifest:
+        return
+    fingerprinted = set(manifest.values())
+    send_static_file = app.view_functions['static']
+
+    @app.url_defaults
+    def fingerprinted_url(endpoint, values):
+        if endpoint == 'static' and values.get('filename') in manifest:
+            values['filename'] = manifest[values['filename']]
+
+    def static(filename):
+        if filename not in fingerprinted:
+            return send_static_file(filename=filename)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        encoding = None
+        for suffix, content_encoding, token in ENCODINGS:
+            if request.accept_encodings[token] and os.path.isfile(os.path.join(static_folder, filename + suffix)):
+                encoding = content_encoding
+                filename += suffix
+                break
+        response = send_from_directory(static_folder, filename, mimetype=mimetype, max_age=31536000)
+        response.cache_control.immutable = True
+        response.cache_control.public = True
+        response.vary.add('Accept-Encoding')
+        if encoding is not None:
+            response.content_encoding = encoding
+        return response
+
+    app.view_functions['static'] = static
@@ -0,0 +1,227 @@
+import os
+import unittest
+import warnings
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+# point the app at the test database before it is imported
+os.environ.setdefault('DATABASE_URL', 'postgresql://localhost:5432/fyyur_test')
+
+from app import app, db, Venue, Artist, Show, search_indexes, availability, matches, recent_activity, page_cache
+
+
+class FyyurTestCase(unittest.TestCase):
+    """This class represents the fyyur test case"""
+
+    def setUp(self):
+        """Create the tables and a venue, an artist and a show between them."""
+        app.config['WTF_CSRF_ENABLED'] = False
+        self.client = app.test_client
+        with app.app_context():
+            db.session.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+            db.session.commit()
+            db.create_all()
+            venue = Venue(name='The Musical Hop', city='San Francisco', state='CA',
+                          address='1015 Folsom Street', genres=['Jazz'])
+            artist = Artist(name='Guns N Petals', city='San Francisco', state='CA', genres=['Rock n Roll'])
+            db.session.add_all([venue, artist])
+            db.session.flush()
+            db.session.add(Show(venue_id=venue.id, artist_id=artist.id,
+                                start_time=datetime.now() + timedelta(days=1)))
+            db.session.commit()
+            self.venue_id, self.artist_id = venue.id, artist.id
+
+    def tearDown(self):
+        """Drop the tables and forget what the process cached about them"""
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+        search_indexes.clear()
+        availability.clear()
+        matches.clear()
+        recent_activity.clear()
+        if page_cache is not None:
+            page_cache.clear()
+
+    def flashes(self, client):
+        with client.session_transaction() as session:
+            return [message for _, message in session.get('_flashes', [])]
+
+    def test_delete_venue_cascades_to_its_shows(self):
+        """Test case to delete a venue, its shows going with it"""
+        client = self.client()
+        response = client.delete('/venues/{}'.format(self.venue_id))
+        data = response.get_json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['deleted'], [self.venue_id])
+        self.assertEqual(self.flashes(client), ['Venue The Musical Hop was deleted successfully!'])
+        with app.app_context():
+            self.assertIsNone(db.session.get(Venue, self.venue_id))
+            self.assertEqual(Show.query.count(), 0)
+            self.assertIsNotNone(db.session.get(Artist, self.artist_id))
+
+    def test_batch_delete_flashes_one_message(self):
+        """Test case to delete several artists at once"""
+        with app.app_context():
+            other = Artist(name='Matt Quevedo', city='New York', state='NY', genres=['Jazz'])
+            db.session.add(other)
+            db.session.commit()
+            other_id = other.id
+        client = self.client()
+        response = client.delete('/artists', json={'ids': [self.artist_id, other_id]})
+        data = response.get_json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(data['deleted']), sorted([self.artist_id, other_id]))
+        self.assertEqual(self.flashes(client), ['2 artists were deleted successfully!'])
+        with app.app_context():
+            self.assertEqual(Artist.query.count(), 0)
+            self.assertEqual(Show.query.count(), 0)
+
+    def test_404_sent_deleting_non_existing_venue(self):
+        """Test case for deleting a non-existing venue"""
+        response = self.client().delete('/venues/1000')
+        data = response.get_json()
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(data['success'], False)
+        self.assertEqual(data['deleted'], [])
+
+    def test_422_sent_deleting_with_invalid_ids(self):
+        """Test case for a batch delete with ids that are not numbers"""
+        response = self.client().delete('/venues', json={'ids': [self.venue_id, 'abc']})
+        data = response.get_json()
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(data['success'], False)
+        with app.app_context():
+            self.assertIsNotNone(db.session.get(Venue, self.venue_id))
+
+    def test_create_show_records_recent_activity(self):
+        """Test case to list a show, named after its venue and artist on the home page"""
+        with app.app_context():
+            recent_activity.latest()
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            response = self.client().post('/shows/create', data={
+                'venue_id': self.venue_id,
+                'artist_id': self.artist_id,
+                'start_time': '2030-01-01 20:00:00'
+            })
+
+        self.assertEqual(response.status_code, 200)
+        show = recent_activity.latest()['show'][0]
+        self.assertEqual(show['venue_name'], 'The Musical Hop')
+        self.assertEqual(show['artist_name'], 'Guns N Petals')
+        self.assertEqual(show['start_time'], datetime(2030, 1, 1, 20, 0))
+
+    def test_create_show_in_placeholder_format(self):
+        """Test case to list a show with a time typed as the form's placeholder (YYYY-MM-DD HH:MM)"""
+        response = self.client().post('/shows/create', data={
+            'venue_id': self.venue_id,
+            'artist_id': self.artist_id,
+            'start_time': '2030-01-02 20:00'
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Show was successfully listed!', response.data)
+        with app.app_context():
+            self.assertEqual(Show.query.filter(Show.start_time == datetime(2030, 1, 2, 20, 0)).count(), 1)
+
+    def test_create_show_with_invalid_time(self):
+        """Test case for a start time that is not a date"""
+        response = self.client().post('/shows/create', data={
+            'venue_id': self.venue_id,
+            'artist_id': self.artist_id,
+            'start_time': 'next friday'
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Show could not be listed: Not a valid datetime value.', response.data)
+        with app.app_context():
+            self.assertEqual(Show.query.count(), 1)
+
+    def test_overlapping_shows_are_rejected_by_the_schema(self):
+        """Test case for the exclusion constraints created by create_all"""
+        with app.app_context():
+            if db.engine.dialect.name != 'postgresql':
+                self.skipTest('exclusion constraints are Postgres only')
+            show = Show.query.one()
+            db.session.add(Show(venue_id=self.venue_id, artist_id=self.artist_id,
+                                start_time=show.start_time + timedelta(hours=1)))
+            with self.assertRaises(IntegrityError):
+                db.session.commit()
+            db.session.rollback()
+
+    def test_matches_count_past_shows_only(self):
+        """Test case for the shows together of a match, the upcoming show of setUp not counting"""
+        with app.app_context():
+            db.session.get(Artist, self.artist_id).seeking_venue = True
+            db.session.commit()
+        response = self.client().get('/venues/{}/matches'.format(self.venue_id))
+        data = response.get_json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([match['id'] for match in data['matches']], [self.artist_id])
+        self.assertEqual(data['matches'][0]['shows_together'], 0)
+
+        with app.app_context():
+            db.session.add(Show(venue_id=self.venue_id, artist_id=self.artist_id,
+                                start_time=datetime.now() - timedelta(days=30)))
+            db.session.commit()
+        data = self.client().get('/venues/{}/matches'.format(self.venue_id)).get_json()
+
+        self.assertEqual(data['matches'][0]['shows_together'], 1)
+
+    def test_edit_venue_with_invalid_seeking_value(self):
+        """Test case for an edit whose seeking_talent is not 0/1, refused with a flash"""
+        client = self.client()
+        response = client.post('/venues/{}/edit'.format(self.venue_id), data={
+            'name': 'The Jazz Hop', 'city': 'San Francisco', 'state': 'CA',
+            'address': '1015 Folsom Street', 'phone': '', 'genres': ['Jazz'], 'website': '',
+            'facebook_link': '', 'image_link': '', 'seeking_talent': 'yes', 'seeking_description': ''})
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.flashes(client), ['An error occurred! Venue The Jazz Hop could not be updated.'])
+        with app.app_context():
+            self.assertEqual(db.session.get(Venue, self.venue_id).name, 'The Musical Hop')
+
+    def test_edit_artist_with_missing_field(self):
+        """Test case for an edit posted without the seeking_venue field"""
+        client = self.client()
+        response = client.post('/artists/{}/edit'.format(self.artist_id), data={'name': 'Guns N Roses'})
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.flashes(client), ['An error occurred. Artist Guns N Roses could not be updated.'])
+        with app.app_context():
+            self.assertEqual(db.session.get(Artist, self.artist_id).name, 'Guns N Petals')
+
+    def test_search_venues_with_memory_backend(self):
+        """Test case for venue search served by the in-process n-gram index"""
+        app.config['SEARCH_BACKEND'] = 'memory'
+        try:
+            client = self.client()
+            response = client.post('/venues/search', data={'search_term': 'musical'})
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b'The Musical Hop', response.data)
+
+            # a rename made after the index was built is picked up
+            client.post('/venues/{}/edit'.format(self.venue_id), data={
+                'name': 'The Jazz Hop', 'city': 'San Francisco', 'state': 'CA',
+                'address': '1015 Folsom Street', 'phone': '', 'genres': ['Jazz'], 'website': '',
+                'facebook_link': '', 'image_link': '', 'seeking_talent': '0', 'seeking_description': ''})
+            response = client.post('/venues/search', data={'search_term': 'musical'})
+            self.assertNotIn(b'The Musical Hop', response.data)
+            response = client.post('/venues/search', data={'search_term': 'jazz hop'})
+            self.assertIn(b'The Jazz Hop', response.data)
+        finally:
+            app.config['SEARCH_BACKEND'] = 'pg_trgm'
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+from datetime import datetime, timedelta
+
+from availability import AvailabilityIndex, Schedule, parse_naive
+
+DURATION = timedelta(hours=3)
+NOON = datetime(2026, 1, 1, 12, 0)
+
+
+class AvailabilityTestCase(unittest.TestCase):
+    """This class represents the double-booking and free slot test case"""
+
+    def setUp(self):
+        """Schedules: venue 1 has a show at noon, artist 2 has none"""
+        self.bookings = {('venue', 1): [NOON], ('artist', 2): []}
+        self.index = AvailabilityIndex(DURATION, lambda kind, entity_id: self.bookings[(kind, entity_id)])
+
+    def test_show_ending_when_another_starts_does_not_conflict(self):
+        """Test case for shows touching the booked one on either side"""
+        self.assertEqual(self.index.conflicts(1, 2, NOON - DURATION), [])
+        self.assertEqual(self.index.conflicts(1, 2, NOON + DURATION), [])
+
+    def test_overlapping_show_conflicts(self):
+        """Test case for shows overlapping the booked one by a minute"""
+        minute = timedelta(minutes=1)
+        self.assertEqual(self.index.conflicts(1, 2, NOON - DURATION + minute), ['venue'])
+        self.assertEqual(self.index.conflicts(1, 2, NOON + DURATION - minute), ['venue'])
+        self.assertEqual(self.index.conflicts(1, 2, NOON), ['venue'])
+
+    def test_booked_show_conflicts_for_both_sides(self):
+        """Test case for a show booked after the schedules were loaded"""
+        start = NOON + timedelta(days=1)
+        self.assertEqual(self.index.conflicts(1, 2, start), [])
+        self.index.book(1, 2, start)
+        self.assertEqual(self.index.conflicts(1, 2, start), ['venue', 'artist'])
+
+    def test_free_slots_of_empty_schedule(self):
+        """Test case for free slots when nothing is booked"""
+        end = NOON + timedelta(days=1)
+        self.assertEqual(self.index.free_slots('artist', 2, NOON, end), [(NOON, end)])
+
+    def test_free_slots_around_booked_show(self):
+        """Test case for free slots touching the booked show"""
+        begin, end = NOON - DURATION, NOON + 2 * DURATION
+        self.assertEqual(self.index.free_slots('venue', 1, begin, end),
+                         [(begin, NOON), (NOON + DURATION, end)])
+
+    def test_free_slots_shorter_than_a_show_are_dropped(self):
+        """Test case for gaps too short for a show"""
+        begin = NOON - DURATION + timedelta(minutes=1)
+        self.assertEqual(self.index.free_slots('venue', 1, begin, NOON + DURATION), [])
+
+    def test_free_slots_of_window_shorter_than_a_show(self):
+        """Test case for a window too short for any show"""
+        schedule = Schedule(DURATION)
+        self.assertEqual(schedule.free_slots(NOON, NOON + DURATION - timedelta(minutes=1)), [])
+
+    def test_parse_naive_converts_offsets_to_utc(self):
+        """Test case for ISO datetimes with and without an offset"""
+        self.assertEqual(parse_naive('2026-01-01T12:00'), NOON)
+        self.assertEqual(parse_naive('2026-01-01T14:00+02:00'), NOON)
+        self.assertIsNone(parse_naive('2026-01-01T12:00+00:00').tzinfo)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
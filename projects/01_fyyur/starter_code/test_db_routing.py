@@ -0,0 +1,125 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import text
+
+from db_routing import RoutingSession, init_read_your_writes, read_only, use_primary
+
+
+def create_app(primary, *replicas):
+    """App with one table, its reads routed like the fyyur controllers"""
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'test'
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + primary
+    app.config['SQLALCHEMY_BINDS'] = {'replica_{}'.format(i): 'sqlite:///' + replica
+                                      for i, replica in enumerate(replicas)}
+    db = SQLAlchemy(app, session_options={'class_': RoutingSession})
+    init_read_your_writes(app)
+
+    def names():
+        return sorted(row[0] for row in db.session.execute(text('SELECT name FROM venues')))
+
+    @app.route('/venues')
+    @read_only
+    def venues():
+        return {'names': names()}
+
+    @app.route('/venues/twice')
+    @read_only
+    def venues_twice():
+        return {'names': [names() for _ in range(10)]}
+
+    @app.route('/venues/primary')
+    def venues_from_primary():
+        with use_primary():
+            return venues()
+
+    @app.route('/venues', methods=['POST'])
+    def create_venue():
+        db.session.execute(text("INSERT INTO venues (name) VALUES ('Park Square Live')"))
+        db.session.commit()
+        return {'success': True}
+
+    with app.app_context():
+        for engine in db.engines.values():
+            with engine.begin() as connection:
+                connection.execute(text('CREATE TABLE venues (id INTEGER PRIMARY KEY, name VARCHAR)'))
+                connection.execute(text("INSERT INTO venues (name) VALUES ('The Musical Hop')"))
+        # a row each replica has and the primary does not, telling them apart
+        for i in range(len(replicas)):
+            with db.engines['replica_{}'.format(i)].begin() as connection:
+                connection.execute(text('INSERT INTO venues (name) VALUES (:name)'),
+                                   {'name': 'Replica {}'.format(i) if i else 'Replica Only'})
+    return app
+
+
+class ReadReplicaTestCase(unittest.TestCase):
+    """This class represents the read replica routing test case"""
+
+    def setUp(self):
+        """Primary and replica in two SQLite files"""
+        self.directory = tempfile.mkdtemp()
+        self.app = create_app(os.path.join(self.directory, 'primary.db'),
+                              os.path.join(self.directory, 'replica.db'))
+        self.client = self.app.test_client
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_read_only_view_reads_replica(self):
+        """Test case for a read-only view with no recent write"""
+        response = self.client().get('/venues')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['names'], ['Replica Only', 'The Musical Hop'])
+
+    def test_read_after_write_reads_primary(self):
+        """Test case for the read following a write of the same browser"""
+        client = self.client()
+        client.post('/venues')
+        response = client.get('/venues')
+
+        self.assertEqual(response.get_json()['names'], ['Park Square Live', 'The Musical Hop'])
+
+    def test_other_browsers_keep_reading_replica(self):
+        """Test case for the reads of a browser that did not write"""
+        self.client().post('/venues')
+        response = self.client().get('/venues')
+
+        self.assertEqual(response.get_json()['names'], ['Replica Only', 'The Musical Hop'])
+
+    def test_read_after_write_window_expires(self):
+        """Test case for a read long after a write"""
+        self.app.config['READ_YOUR_WRITES_SECONDS'] = 0
+        client = self.client()
+        client.post('/venues')
+        response = client.get('/venues')
+
+        self.assertEqual(response.get_json()['names'], ['Replica Only', 'The Musical Hop'])
+
+    def test_one_replica_per_request(self):
+        """Test case for the queries of a request all reading the same replica"""
+        app = create_app(*[os.path.join(self.directory, name)
+                           for name in ('primary_2.db', 'replica_a.db', 'replica_b.db', 'replica_c.db')])
+        seen = set()
+        for _ in range(20):
+            answers = app.test_client().get('/venues/twice').get_json()['names']
+            self.assertEqual(len({tuple(answer) for answer in answers}), 1)
+            seen.add(tuple(answers[0]))
+
+        self.assertTrue(len(seen) > 1)
+
+    def test_use_primary_around_read_only_view(self):
+        """Test case for forcing the primary around a read-only view"""
+        response = self.client().get('/venues/primary')
+
+        self.assertEqual(response.get_json()['names'], ['The Musical Hop'])
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import threading
+import unittest
+
+from search import NgramIndex, ngrams, similarity
+
+
+class NgramIndexTestCase(unittest.TestCase):
+    """This class represents the in-process venue/artist search test case"""
+
+    def setUp(self):
+        """Venues indexed by name, city and state"""
+        self.index = NgramIndex()
+        self.index.add(1, ('The Musical Hop', 'San Francisco', 'CA'))
+        self.index.add(2, ('The Dueling Pianos Bar', 'New York', 'NY'))
+        self.index.add(3, ('Park Square Live Music & Coffee', 'San Francisco', 'CA'))
+
+    def test_search_is_case_insensitive_substring(self):
+        """Test case for ILIKE '%term%' semantics"""
+        self.assertEqual(sorted(self.index.search('MUSIC')[0]), [1, 3])
+        self.assertEqual(self.index.search('ueling')[0], [2])
+        self.assertEqual(self.index.search('hop music')[0], [])
+
+    def test_search_matches_every_field(self):
+        """Test case for terms found in the city or state"""
+        self.assertEqual(sorted(self.index.search('san fran')[0]), [1, 3])
+        self.assertEqual(self.index.search('ny')[0], [2])
+
+    def test_short_and_empty_terms(self):
+        """Test case for terms shorter than the n-grams"""
+        self.assertEqual(sorted(self.index.search('k')[0]), [2, 3])
+        self.assertEqual(sorted(self.index.search('')[0]), [1, 2, 3])
+
+    def test_best_match_first_and_limit(self):
+        """Test case for ranking by trigram similarity"""
+        self.index.add(4, ('Music', 'Austin', 'TX'))
+        ids, total = self.index.search('music', limit=2)
+
+        self.assertEqual(total, 3)
+        self.assertEqual(ids[0], 4)
+        self.assertEqual(len(ids), 2)
+
+    def test_readd_and_remove(self):
+        """Test case for a renamed and a deleted venue"""
+        self.index.add(1, ('The Jazz Hop', 'San Francisco', 'CA'))
+        self.index.remove(3)
+
+        self.assertEqual(self.index.search('music')[0], [])
+        self.assertEqual(self.index.search('jazz')[0], [1])
+        self.assertEqual(len(self.index), 2)
+        self.assertNotIn(3, set().union(*self.index.postings.values()))
+
+    def test_concurrent_writes_and_searches(self):
+        """Test case for edits made while other threads search"""
+        errors = []
+
+        def write(offset):
+            for doc_id in range(offset, offset + 200):
+                self.index.add(doc_id, ('Venue {}'.format(doc_id), 'Austin', 'TX'))
+                self.index.remove(doc_id)
+
+        def read():
+            try:
+                for _ in range(200):
+                    self.index.search('venue')
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=write, args=(offset,)) for offset in (100, 1000)] + \
+                  [threading.Thread(target=read) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(self.index.search('')[0]), [1, 2, 3])
+
+    def test_ngrams_and_similarity(self):
+        """Test case for the n-grams and the pg_trgm style similarity"""
+        self.assertEqual(ngrams('Ab'), {'a', 'b', 'ab'})
+        self.assertEqual(similarity('music', 'music'), 1.0)
+        self.assertEqual(similarity('music', 'jazz'), 0.0)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import posixpath
+import re
+import shutil
+import tempfile
+import unittest
+
+from static_assets import DIST_DIR, build_assets, load_manifest
+
+
+class StaticAssetsTestCase(unittest.TestCase):
+    """This class represents the fingerprinted static assets test case"""
+
+    def setUp(self):
+        """A static folder with a stylesheet referencing an image and a font"""
+        self.static_folder = tempfile.mkdtemp()
+        self.write('img/logo.png', b'\x89PNG not really')
+        self.write('fonts/icons.woff', b'wOFF not really')
+        self.write('css/main.css', b'.logo { background: url("../img/logo.png"); }\n'
+                                   b'@font-face { src: url(../fonts/icons.woff?v=3#icons); }\n'
+                                   b'.remote { background: url(https://example.com/a.png); }\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.static_folder)
+
+    def write(self, path, content):
+        path = os.path.join(self.static_folder, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+
+    def read(self, path):
+        with open(os.path.join(self.static_folder, path), 'rb') as f:
+            return f.read()
+
+    def test_build_writes_fingerprinted_files_and_manifest(self):
+        """Test case for the files and manifest written by a build"""
+        manifest = build_assets(self.static_folder)
+
+        self.assertEqual(load_manifest(self.static_folder), manifest)
+        self.assertEqual(sorted(manifest), ['css/main.css', 'fonts/icons.woff', 'img/logo.png'])
+        for path, built in manifest.items():
+            self.assertTrue(re.match(r'dist/{}\.[0-9a-f]{{12}}{}$'.format(*posixpath.splitext(path)), built))
+            self.assertTrue(os.path.isfile(os.path.join(self.static_folder, built)))
+        self.assertTrue(os.path.isfile(os.path.join(self.static_folder, manifest['css/main.css'] + '.gz')))
+
+    def test_rewritten_css_urls_resolve_to_built_files(self):
+        """Test case for url() references of a built stylesheet"""
+        manifest = build_assets(self.static_folder)
+        stylesheet = manifest['css/main.css']
+        css = self.read(stylesheet).decode('utf-8')
+        urls = re.findall(r'''url\((['"]?)([^'")]+)\1\)''', css)
+
+        resolved = {}
+        for _, url in urls:
+            if url.startswith('https:'):
+                continue
+            target = re.match(r'[^?#]*', url).group(0)
+            resolved[url] = posixpath.normpath(posixpath.join(posixpath.dirname(stylesheet), target))
+        self.assertEqual(sorted(resolved.values()), sorted([manifest['fonts/icons.woff'], manifest['img/logo.png']]))
+        for built in resolved.values():
+            self.assertTrue(built.startswith(DIST_DIR + '/'))
+            self.assertTrue(os.path.isfile(os.path.join(self.static_folder, built)))
+        self.assertIn('?v=3#icons)', css)
+        self.assertIn('url(https://example.com/a.png)', css)
+
+    def test_rebuild_skips_previous_build(self):
+        """Test case for building twice, dist/ not being fingerprinted itself"""
+        first = build_assets(self.static_folder)
+        second = build_assets(self.static_folder)
+
+        self.assertEqual(first, second)
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
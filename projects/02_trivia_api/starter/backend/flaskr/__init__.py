@@ -1,11 +1,15 @@
+import base64
 import json
 import os
-from flask import Flask, request, abort, jsonify
+import click
+from flask import Flask, request, abort, jsonify, current_app
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
-import random
+from sqlalchemy import func, literal_column
 
-from models import setup_db, Question, Category
+from flaskr.quiz import QuizSessions
+from models import setup_db, db, Question, question_counts, category_cache, question_index
+from search import TEXT_SEARCH_CONFIG, has_search_vector, install_search_vector
 
 # ----------------------------------------------------------------------------#
 # App Setup
@@ -14,28 +18,138 @@ from models import setup_db, Question, Category
 QUESTIONS_PER_PAGE = 10
 
 
-def paginate_questions(request, selection):
-    """Paginate question by QUESTIONS_PER_PAGE
+def encode_cursor(direction, question_id):
+    """Opaque cursor: 'a' (after) or 'b' (before) a question id, base64 encoded"""
+    return base64.urlsafe_b64encode('{}:{}'.format(direction, question_id).encode()).decode()
+
+
+def decode_cursor(cursor, directions=('a', 'b')):
+    """Inverse of encode_cursor; aborts with 400 on a malformed cursor
+
+    Returns:
+        -tuple: (direction, question id)
+    """
+    try:
+        direction, question_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(':')
+        if direction not in directions:
+            raise ValueError(direction)
+        return direction, int(question_id)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        abort(400)
+
+
+def read_position(request, directions=('a', 'b')):
+    """Where the requested page starts: the decoded ?cursor=, else ('p', ?page=)
+
+    Handlers whose bare except turns every error into a 422 read it before
+    their try block, so that a malformed cursor is answered with a 400.
+    """
+    cursor = request.args.get('cursor', None)
+    if cursor is not None:
+        return decode_cursor(cursor, directions)
+    return 'p', max(request.args.get('page', 1, type=int), 1)
+
+
+def paginate_questions(request, query, position=None):
+    """Paginate a question query by QUESTIONS_PER_PAGE in SQL
+
+    The page is chosen by ?cursor= (a next_cursor/prev_cursor of an earlier
+    response), which becomes an `id > cursor` / `id < cursor` predicate, so
+    every page costs one LIMIT query on the primary key whatever the number
+    of questions. ?page= (starting from 1) still works, with an OFFSET.
 
     Parameters:
         -request (obj): an instance of request_class
-        -all_questions (list): selection of questions that are queried from database
+        -query (obj): unordered Question query, possibly filtered
+        -position (tuple): read_position(request), read from request when None
+
+    Returns:
+        -tuple: (list of formatted questions, {'next': cursor, 'prev': cursor}),
+                a cursor is None when there is no page in that direction
+    """
+    direction, value = position or read_position(request)
+    # One extra row tells whether there is a page after this one
+    limit = QUESTIONS_PER_PAGE + 1
+
+    if direction != 'p':
+        question_id = value
+        if direction == 'a':
+            rows = query.filter(Question.id > question_id).order_by(Question.id).limit(limit).all()
+            has_next, has_prev = len(rows) == limit, True
+            rows = rows[:QUESTIONS_PER_PAGE]
+        else:
+            rows = query.filter(Question.id < question_id).order_by(Question.id.desc()).limit(limit).all()
+            has_next, has_prev = True, len(rows) == limit
+            rows = rows[:QUESTIONS_PER_PAGE][::-1]
+    else:
+        page = value
+        rows = query.order_by(Question.id).offset((page - 1) * QUESTIONS_PER_PAGE).limit(limit).all()
+        has_next, has_prev = len(rows) == limit, page > 1
+        rows = rows[:QUESTIONS_PER_PAGE]
+
+    cursors = {
+        'next': encode_cursor('a', rows[-1].id) if rows and has_next else None,
+        'prev': encode_cursor('b', rows[0].id) if rows and has_prev else None
+    }
+    return [question.format() for question in rows], cursors
+
+
+def count_questions(query):
+    """COUNT(*) of a filtered question query, without loading any row
+
+    Totals of the whole table and of a category come from the maintained
+    counters in question_counts instead.
+    """
+    return query.with_entities(func.count(Question.id)).order_by(None).scalar()
+
+
+def search_ranked(search_term, offset, limit):
+    """Ids of the questions matching search_term in their question or answer, best first
+
+    Postgres matches the GIN indexed search_vector column and ranks with
+    ts_rank; other databases, and Postgres before `flask install-search`,
+    use the in-process question_index.
 
     Returns:
-        -list: a paginated question list (max 10 questions per page)
+        -tuple: (list of question ids from offset, number of matches)
     """
+    if not current_app.config.get('SEARCH_VECTOR'):
+        return question_index.search(search_term, offset, limit)
+    search_vector = literal_column('questions.search_vector')
+    ts_query = func.plainto_tsquery(TEXT_SEARCH_CONFIG, search_term)
+    matches = Question.query.filter(search_vector.op('@@')(ts_query))
+    rows = matches.with_entities(Question.id) \
+        .order_by(func.ts_rank(search_vector, ts_query).desc(), Question.id) \
+        .offset(offset).limit(limit).all()
+    return [question_id for question_id, in rows], count_questions(matches)
+
 
-    # Get page from request, default to 1 if it's not provided
-    page = request.args.get('page', 1, type=int)
-    # Slice: start
-    start = (page - 1) * QUESTIONS_PER_PAGE
-    # slice: end
-    end = start + QUESTIONS_PER_PAGE
-    # Format all_questions into a list of dicts and slice
-    questions = [question.format() for question in selection]
-    current_questions = questions[start:end]
+def paginate_ranked(request, search_term, position=None):
+    """One page of ranked search results
 
-    return current_questions
+    Ranked results are not in id order, so their cursors carry an offset
+    ('o') instead of an id; ?page= works as for paginate_questions.
+
+    Parameters:
+        -position (tuple): read_position(request, directions=('o',)), read from request when None
+
+    Returns:
+        -tuple: (list of formatted questions, {'next': cursor, 'prev': cursor}, number of matches)
+    """
+    direction, value = position or read_position(request, directions=('o',))
+    if direction == 'o':
+        offset = max(value, 0)
+    else:
+        offset = (value - 1) * QUESTIONS_PER_PAGE
+    ids, total = search_ranked(search_term, offset, QUESTIONS_PER_PAGE)
+    by_id = {question.id: question for question in Question.query.filter(Question.id.in_(ids))} if ids else {}
+    questions = [by_id[question_id].format() for question_id in ids if question_id in by_id]
+
+    cursors = {
+        'next': encode_cursor('o', offset + QUESTIONS_PER_PAGE) if offset + QUESTIONS_PER_PAGE < total else None,
+        'prev': encode_cursor('o', max(offset - QUESTIONS_PER_PAGE, 0)) if offset > 0 and total else None
+    }
+    return questions, cursors, total
 
 
 def create_app(test_config=None):
@@ -54,6 +168,13 @@ def create_app(test_config=None):
     # create and configure the app
     app = Flask(__name__)
     setup_db(app)
+    # Categories are served from memory, see models.CategoryCache
+    with app.app_context():
+        category_cache.load()
+        app.config['SEARCH_VECTOR'] = has_search_vector(db.engine)
+        if db.engine.dialect.name == 'postgresql' and not app.config['SEARCH_VECTOR']:
+            app.logger.warning('questions.search_vector is missing, run `flask install-search`; '
+                               'searching with the in-process index meanwhile')
     # Set up CORS that allows '*' for origins.
     CORS(app, resources={r"/*": {"origins": "*"}})
 
@@ -89,8 +210,7 @@ def create_app(test_config=None):
             422: Unprocessable request
         """
         try:
-            categories_query = Category.query.order_by(Category.id).all()
-            all_categories = [category.type for category in categories_query]
+            all_categories = category_cache.types()
 
             if len(all_categories) == 0:
                 abort(404)
@@ -116,13 +236,11 @@ def create_app(test_config=None):
                 "total_questions": total number of questions
 
         Error handling:
+            400: bad request if ?cursor= is malformed
             404: Resource not found if no such a question
         """
-        questions_query = Question.query.order_by(Question.id).all()
-        current_questions = paginate_questions(request, questions_query)
-        category_query = Category.query.order_by(Category.id).all()
-
-        categories = [category.type for category in category_query]
+        current_questions, cursors = paginate_questions(request, Question.query)
+        categories = category_cache.types()
 
         if len(current_questions) == 0:
             abort(404)
@@ -130,8 +248,10 @@ def create_app(test_config=None):
         return jsonify({
             'success': True,
             'questions': current_questions,
+            'next_cursor': cursors['next'],
+            'prev_cursor': cursors['prev'],
             'categories': categories,
-            'total_questions': len(questions_query)
+            'total_questions': question_counts.total()
         })
 
     @app.route('/questions/<int:question_id>', methods=['DELETE'])
@@ -149,9 +269,11 @@ def create_app(test_config=None):
                 "total_questions": the total number of questions
 
         Error handling:
+            400: bad request if ?cursor= is malformed
             404: resource not found if no such question
             422: unprocessable request
         """
+        position = read_position(request)
         try:
             question = Question.query.filter(Question.id == question_id).one_or_none()
 
@@ -159,14 +281,15 @@ def create_app(test_config=None):
                 abort(404)
 
             question.delete()
-            questions_query = Question.query.order_by(Question.id).all()
-            current_questions = paginate_questions(request, questions_query)
+            current_questions, cursors = paginate_questions(request, Question.query, position)
 
             return jsonify({
                 'success': True,
                 'deleted question': question_id,
                 'questions': current_questions,
-                'total_questions': len(questions_query)
+                'next_cursor': cursors['next'],
+                'prev_cursor': cursors['prev'],
+                'total_questions': question_counts.total()
             })
 
         except:
@@ -192,6 +315,7 @@ def create_app(test_config=None):
                 "Total questions": total amount of questions
 
         Error handling:
+            400: bad request if ?cursor= is malformed
             422: unprocessable request if new question or answer is blank
         """
         body = request.get_json()
@@ -199,6 +323,7 @@ def create_app(test_config=None):
         new_answer = body.get('answer', None)
         new_category = body.get('category', None)
         new_difficulty = body.get('difficulty', None)
+        position = read_position(request)
 
         try:
             new_question = Question(
@@ -207,21 +332,23 @@ def create_app(test_config=None):
                 category=new_category,
                 difficulty=new_difficulty
             )
-            if new_question.question == "" or new_question.answer == "":
+            # Unknown categories are rejected before anything is written
+            current_category = category_cache.get(new_category)
+            if new_question.question == "" or new_question.answer == "" or current_category is None:
                 abort(422)
             else:
                 new_question.insert()
 
-            current_category = Category.query.get(new_category).type
-            questions_query = Question.query.order_by(Question.id).all()
-            current_questions = paginate_questions(request, questions_query)
+            current_questions, cursors = paginate_questions(request, Question.query, position)
 
             return jsonify({
                 'Success': True,
                 'Question ID': new_question.id,
                 'Category': current_category,
                 'Questions': current_questions,
-                'Total Questions': len(questions_query)
+                'Next Cursor': cursors['next'],
+                'Prev Cursor': cursors['prev'],
+                'Total Questions': question_counts.total()
             })
 
         except:
@@ -231,23 +358,24 @@ def create_app(test_config=None):
     def search_questions():
         """An endpoint to handle POST requests for '/search_questions'
 
-        Get questions based on a search term; It should return any questions for whom
-        the search term is a substring of the question
+        Get questions based on a search term; It should return the questions whose question or answer
+        contains every word of the search term, most relevant first (see search_ranked)
 
         Return:
               "success": True
               "questions": list of paginated questions
-              "total_questions": the total number of questions
+              "next_cursor", "prev_cursor": cursors of the neighbouring pages of results
+              "total_questions": the number of questions matching the search term
 
         Error Handling:
+            400: bad request if ?cursor= is malformed
             404: Resource not found if no such question
             422: unprocessable request
         """
         search_term = request.json.get('searchTerm', None)
+        position = read_position(request, directions=('o',))
         try:
-            search_question = Question.query.filter(Question.question.ilike('%{}%'.format(search_term)))\
-                .order_by(Question.id).all()
-            current_questions = paginate_questions(request, search_question)
+            current_questions, cursors, total_questions = paginate_ranked(request, search_term, position)
 
             if len(current_questions) == 0:
                 abort(404)
@@ -255,7 +383,9 @@ def create_app(test_config=None):
             return jsonify({
                 'success': True,
                 'questions': current_questions,
-                'total_questions': len(Question.query.all())
+                'next_cursor': cursors['next'],
+                'prev_cursor': cursors['prev'],
+                'total_questions': total_questions
             })
 
         except:
@@ -273,26 +403,41 @@ def create_app(test_config=None):
                 "success": True
                 "questions": a list of paginated questions belongs to the selected category
                 "current_category": the selected category
-                "total_questions": the total number of questions
+                "total_questions": the number of questions in the category
 
         Error handling:
+            400: bad request if ?cursor= is malformed
             404: resource not found if no question in the category
         """
-        questions_query = Question.query.filter(Question.category == str(category_id)).order_by(Question.id).all()
-        current_questions = paginate_questions(request, questions_query)
+        questions_query = Question.query.filter(Question.category == str(category_id))
+        current_questions, cursors = paginate_questions(request, questions_query)
 
         if len(current_questions) == 0:
             abort(404)
 
-        current_category = Category.query.get(category_id).type
+        current_category = category_cache.get(category_id)
+        if current_category is None:
+            abort(404)
 
         return jsonify({
             'success': True,
             'questions': current_questions,
+            'next_cursor': cursors['next'],
+            'prev_cursor': cursors['prev'],
             'current_category': current_category,
-            'total_questions': len(Question.query.all())
+            'total_questions': question_counts.category(category_id)
         })
 
+    quiz_sessions = QuizSessions()
+
+    def deal_quiz(category_id, previous_questions):
+        """Start a quiz session over the ids of a category (0 for all), minus previous_questions"""
+        query = Question.query.with_entities(Question.id)
+        if category_id != 0:
+            query = query.filter(Question.category == str(category_id))
+        excluded = {int(question_id) for question_id in previous_questions}
+        return quiz_sessions.create(question_id for question_id, in query if question_id not in excluded)
+
     @app.route('/quizzes', methods=['POST'])
     def play_quiz():
         """An endpoint to handle POST request for '/quizzes'
@@ -300,46 +445,68 @@ def create_app(test_config=None):
         Getting questions to play the quiz. This endpoint should take category and previous question parameters and
         return a random questions within the given category, if provided, and that is not one of the previous questions.
 
+        The first call deals a shuffled deck of the ids of the category (minus previous_questions) into a quiz
+        session and returns its id; when the client sends it back as quiz_session, the next question is popped
+        from that deck and previous_questions is not needed. An unknown or expired session gets a new deck.
+
         Parameters:
             previous_questions = previous questions
             quiz_category = category of current question
+            quiz_session = id of the quiz session, optional
 
         Return:
             a json object with:
                 "success": True
-                "question": random selection of the question
+                "question": random selection of the question, None when the questions run out
+                "quiz_session": id of the quiz session
 
         Error handling:
             422: unprocessable request
         """
         body = request.get_json()
-        previous_questions = body.get('previous_questions', None)
+        previous_questions = body.get('previous_questions', None) or []
         quiz_category = body.get('quiz_category', None)
+        quiz_session = body.get('quiz_session', None)
 
         try:
-            if quiz_category['id'] == 0:
-                questions_query = Question.query.filter(Question.id.notin_(previous_questions)).all()
-            else:
-                questions_query = Question.query.filter(Question.category == quiz_category['id'],
-                                                        Question.id.notin_(previous_questions)).all()
-            questions = [question.format() for question in questions_query]
-            if len(questions) == 0:
-                return jsonify({
-                    "success:": True,
-                    "question": None
-                })
-
-            random_question = random.choice(questions)
-
-            if random_question:
-                return jsonify({
-                    "success": True,
-                    "question": random_question
-                })
+            try:
+                question_id = quiz_sessions.draw(quiz_session)
+            except KeyError:
+                quiz_session = deal_quiz(int(quiz_category['id']), previous_questions)
+                question_id = quiz_sessions.draw(quiz_session)
+
+            question = None
+            while question_id is not None:
+                # Only the drawn question is loaded; skip it if it was deleted since the deal
+                question = Question.query.get(question_id)
+                if question is not None:
+                    break
+                question_id = quiz_sessions.draw(quiz_session)
+
+            if question is None:
+                quiz_sessions.end(quiz_session)
+
+            return jsonify({
+                "success": True,
+                "question": question.format() if question is not None else None,
+                "quiz_session": quiz_session
+            })
 
         except:
             abort(422)
 
+    # ---------------------------------------------------------------------#
+    # Commands
+    # ---------------------------------------------------------------------#
+    @app.cli.command('install-search')
+    def install_search_command():
+        """Add the full-text search column, trigger and index to questions (Postgres, run once)"""
+        if db.engine.dialect.name != 'postgresql':
+            raise click.ClickException('search_vector is Postgres only, other databases search in memory')
+        install_search_vector(db.engine)
+        app.config['SEARCH_VECTOR'] = True
+        click.echo('questions.search_vector installed')
+
     # ---------------------------------------------------------------------#
     # Error Handlers
     # ---------------------------------------------------------------------#
@@ -0,0 +1,87 @@
+import random
+import secrets
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+# ----------------------------------------------------------------------------#
+# Quiz sessions
+# ----------------------------------------------------------------------------#
+
+SESSION_TTL = 30 * 60
+MAX_SESSIONS = 10000
+
+
+class QuizSessions:
+    """Shuffled decks of question ids, one per quiz being played
+
+    A deck is dealt once when a quiz starts; every turn pops the next id
+    from the end of a compact array, so a draw costs the same whatever the
+    number of questions or turns. Sessions not used for `ttl` seconds are
+    evicted, and the least recently used ones go first when there are more
+    than `max_sessions`.
+
+    Parameters:
+        -ttl (int): seconds a session lives after its last use
+        -max_sessions (int): number of sessions kept at most
+    """
+
+    def __init__(self, ttl=SESSION_TTL, max_sessions=MAX_SESSIONS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        # session id -> [deck, expiry time], least recently used first
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __contains__(self, session_id):
+        with self.lock:
+            self._evict(time.monotonic())
+            return session_id in self.sessions
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def _evict(self, now):
+        while self.sessions:
+            session_id, (deck, expires) = next(iter(self.sessions.items()))
+            if expires > now and len(self.sessions) <= self.max_sessions:
+                break
+            del self.sessions[session_id]
+
+    def create(self, question_ids):
+        """Deal a shuffled deck of question_ids
+
+        Returns:
+            -str: id of the new session
+        """
+        deck = array('q', question_ids)
+        random.shuffle(deck)
+        session_id = secrets.token_urlsafe(16)
+        with self.lock:
+            now = time.monotonic()
+            self.sessions[session_id] = [deck, now + self.ttl]
+            self._evict(now)
+        return session_id
+
+    def draw(self, session_id):
+        """Pop the next question id of a session
+
+        Returns:
+            -int: a question id, None when the deck is exhausted
+
+        Raises:
+            KeyError: unknown or expired session
+        """
+        with self.lock:
+            now = time.monotonic()
+            self._evict(now)
+            session = self.sessions[session_id]
+            self.sessions.move_to_end(session_id)
+            session[1] = now + self.ttl
+            deck = session[0]
+            return deck.pop() if deck else None
+
+    def end(self, session_id):
+        with self.lock:
+            self.sessions.pop(session_id, None)
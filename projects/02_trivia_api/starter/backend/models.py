@@ -1,8 +1,12 @@
 import os
-from sqlalchemy import Column, String, Integer, create_engine
+import threading
+import time
+from sqlalchemy import Column, String, Integer, create_engine, event, func
 from flask_sqlalchemy import SQLAlchemy
 import json
 
+from search import QuestionIndex
+
 database_name = "trivia"
 database_path = "postgres://{}/{}".format('localhost:5432', database_name)
 
@@ -46,13 +50,19 @@ class Question(db.Model):
     def insert(self):
         db.session.add(self)
         db.session.commit()
+        question_counts.added(self.category)
+        question_index.added(self.id, self.question, self.answer)
 
     def update(self):
         db.session.commit()
+        question_index.added(self.id, self.question, self.answer)
 
     def delete(self):
+        question_id, category = self.id, self.category
         db.session.delete(self)
         db.session.commit()
+        question_counts.removed(category)
+        question_index.removed(question_id)
 
     def format(self):
         return {
@@ -64,6 +74,76 @@ class Question(db.Model):
         }
 
 
+'''
+QuestionCounts
+    number of questions in total and per category, loaded with one
+    GROUP BY query on first use and then kept current by Question.insert
+    and Question.delete, so reading a total does not touch the database.
+    The counters live in the process and only see the writes made through
+    it: with several workers, or writes made with psql, a total can be off
+    until the counters are reloaded, which happens `ttl` seconds after the
+    last load (or on reset()).
+'''
+
+COUNTS_TTL = 60
+
+
+class QuestionCounts:
+
+    def __init__(self, ttl=COUNTS_TTL):
+        self.ttl = ttl
+        self.per_category = None
+        self.all_questions = 0
+        self.loaded_at = None
+        self.lock = threading.Lock()
+
+    def _fresh(self):
+        return self.per_category is not None and time.monotonic() - self.loaded_at < self.ttl
+
+    def _load(self):
+        with self.lock:
+            if self._fresh():
+                return self.per_category, self.all_questions
+        rows = db.session.query(Question.category, func.count(Question.id)) \
+            .group_by(Question.category).all()
+        with self.lock:
+            if not self._fresh():
+                self.per_category = {str(category): count for category, count in rows}
+                self.all_questions = sum(self.per_category.values())
+                self.loaded_at = time.monotonic()
+            return self.per_category, self.all_questions
+
+    def total(self):
+        return self._load()[1]
+
+    def category(self, category):
+        return self._load()[0].get(str(category), 0)
+
+    def added(self, category):
+        with self.lock:
+            if self.per_category is not None:
+                key = str(category)
+                self.per_category[key] = self.per_category.get(key, 0) + 1
+                self.all_questions += 1
+
+    def removed(self, category):
+        with self.lock:
+            if self.per_category is not None:
+                key = str(category)
+                self.per_category[key] = self.per_category.get(key, 0) - 1
+                self.all_questions -= 1
+
+    def reset(self):
+        with self.lock:
+            self.per_category = None
+
+
+question_counts = QuestionCounts()
+
+# Search index used instead of the Postgres search_vector on other databases (see search.py)
+question_index = QuestionIndex(lambda: db.session.query(Question.id, Question.question, Question.answer).all())
+
+
 '''
 Category
 
@@ -84,3 +164,90 @@ class Category(db.Model):
             'id': self.id,
             'type': self.type
         }
+
+    def insert(self):
+        db.session.add(self)
+        db.session.commit()
+
+    def update(self):
+        db.session.commit()
+
+    def delete(self):
+        db.session.delete(self)
+        db.session.commit()
+
+
+'''
+CategoryCache
+    id -> type of every category, held in the process. Categories almost
+    never change, so endpoints read them from here instead of querying the
+    categories table. Every committed write to a Category bumps `version`;
+    a read that finds the cache loaded at an older version reloads it first.
+    A flush only marks the session, and the bump waits for the commit, so a
+    reload never reads rows that are not committed yet nor misses rows that
+    are. `version` is per process: a category written by another worker or
+    with psql is not seen here, and the other workers keep serving their
+    stale categories, until those processes restart.
+'''
+
+
+class CategoryCache:
+
+    def __init__(self):
+        self.version = 0
+        self.loaded_version = None
+        self.categories = {}
+        self.lock = threading.Lock()
+
+    def load(self):
+        with self.lock:
+            version = self.version
+        rows = db.session.query(Category.id, Category.type).order_by(Category.id).all()
+        with self.lock:
+            self.categories = {category_id: category_type for category_id, category_type in rows}
+            self.loaded_version = version
+
+    def _current(self):
+        if self.loaded_version != self.version:
+            self.load()
+        return self.categories
+
+    def types(self):
+        """Category types ordered by id"""
+        return list(self._current().values())
+
+    def get(self, category_id):
+        """Type of a category, None if there is no such category"""
+        try:
+            return self._current().get(int(category_id))
+        except (TypeError, ValueError):
+            return None
+
+    def invalidate(self, *args):
+        with self.lock:
+            self.version += 1
+
+
+category_cache = CategoryCache()
+
+CATEGORIES_CHANGED = 'categories_changed'
+
+
+@event.listens_for(db.session, 'after_flush')
+def _categories_flushed(session, flush_context):
+    # new, dirty and deleted still hold what this flush wrote
+    if any(isinstance(instance, Category)
+           for instance in (*session.new, *session.dirty, *session.deleted)):
+        session.info[CATEGORIES_CHANGED] = True
+
+
+@event.listens_for(db.session, 'after_commit')
+def _categories_committed(session):
+    if session.info.pop(CATEGORIES_CHANGED, False):
+        category_cache.invalidate()
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _categories_rolled_back(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop(CATEGORIES_CHANGED, None)
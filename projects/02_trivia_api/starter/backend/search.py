@@ -0,0 +1,171 @@
+import math
+import re
+import threading
+
+from sqlalchemy import inspect, text
+
+'''
+Full-text search over questions and answers
+
+On Postgres every question row carries a `search_vector` tsvector (question
+text weighted A, answer weighted B), filled by a trigger and indexed with
+GIN; searches match it with plainto_tsquery and order by ts_rank. They
+are added once with `flask install-search`. Other databases (SQLite in
+tests), and Postgres databases where that has not been run, use
+QuestionIndex, an inverted index held in the process that follows the
+same rules: stop words are dropped, every search word must match, and
+words of the question weigh more than words of the answer.
+'''
+
+TEXT_SEARCH_CONFIG = 'english'
+
+SEARCH_VECTOR_DDL = [
+    "ALTER TABLE questions ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    """
+    CREATE OR REPLACE FUNCTION questions_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('{config}', coalesce(NEW.question, '')), 'A') ||
+            setweight(to_tsvector('{config}', coalesce(NEW.answer, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """.format(config=TEXT_SEARCH_CONFIG),
+    "DROP TRIGGER IF EXISTS questions_search_vector_update ON questions",
+    """
+    CREATE TRIGGER questions_search_vector_update
+    BEFORE INSERT OR UPDATE OF question, answer ON questions
+    FOR EACH ROW EXECUTE PROCEDURE questions_search_vector_update()
+    """,
+    # Rows loaded before the trigger existed (e.g. from trivia.psql)
+    "UPDATE questions SET question = question WHERE search_vector IS NULL",
+    "CREATE INDEX IF NOT EXISTS ix_questions_search_vector ON questions USING gin (search_vector)",
+]
+
+
+def install_search_vector(engine):
+    """Add the search_vector column, its trigger and GIN index (idempotent, Postgres only)
+
+    A setup step run by `flask install-search`, not on every start: the
+    ALTER TABLE and the backfill lock the questions table and rewrite its
+    rows.
+    """
+    with engine.begin() as connection:
+        for statement in SEARCH_VECTOR_DDL:
+            connection.execute(text(statement))
+
+
+def has_search_vector(engine):
+    """True if install_search_vector has been run on this database"""
+    if engine.dialect.name != 'postgresql':
+        return False
+    return any(column['name'] == 'search_vector' for column in inspect(engine).get_columns('questions'))
+
+
+# Weights of the words of the question and of the answer (ts_rank's A and B)
+QUESTION_WEIGHT = 1.0
+ANSWER_WEIGHT = 0.4
+
+WORD = re.compile(r"[a-z0-9]+")
+STOP_WORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below between both
+but by can could did do does doing down during each few for from further had has have having he her here hers
+herself him himself his how i if in into is it its itself just me more most my myself no nor not now of off on
+once only or other our ours ourselves out over own s same she should so some such t than that the their theirs them
+themselves then there these they this those through to too under until up very was we were what when where which
+while who whom why will with would you your yours yourself yourselves
+""".split())
+
+
+def stem(word):
+    """Crude plural folding so 'lakes' finds 'lake' (Postgres uses the Snowball stemmer)"""
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def terms(value):
+    """Search terms of a text: lowercased words without stop words, stemmed"""
+    return [stem(word) for word in WORD.findall((value or '').lower()) if word not in STOP_WORDS]
+
+
+class QuestionIndex:
+    """Inverted index term -> {question id: weight}, loaded on first search
+
+    Parameters:
+        -loader (function): returns (id, question, answer) rows of every question
+    """
+
+    def __init__(self, loader):
+        self.loader = loader
+        self.postings = None
+        self.documents = {}
+        self.lock = threading.Lock()
+
+    def _add(self, question_id, question, answer):
+        weights = {}
+        for weight, value in ((QUESTION_WEIGHT, question), (ANSWER_WEIGHT, answer)):
+            for term in terms(value):
+                weights[term] = weights.get(term, 0.0) + weight
+        self.documents[question_id] = list(weights)
+        for term, weight in weights.items():
+            self.postings.setdefault(term, {})[question_id] = weight
+
+    def _remove(self, question_id):
+        for term in self.documents.pop(question_id, ()):
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(question_id, None)
+                if not posting:
+                    del self.postings[term]
+
+    def _load(self):
+        rows = self.loader()
+        with self.lock:
+            if self.postings is None:
+                self.postings = {}
+                for question_id, question, answer in rows:
+                    self._add(question_id, question, answer)
+
+    def added(self, question_id, question, answer):
+        with self.lock:
+            if self.postings is not None:
+                self._remove(question_id)
+                self._add(question_id, question, answer)
+
+    def removed(self, question_id):
+        with self.lock:
+            if self.postings is not None:
+                self._remove(question_id)
+
+    def reset(self):
+        with self.lock:
+            self.postings = None
+            self.documents = {}
+
+    def search(self, search_term, offset=0, limit=None):
+        """Questions having every term of search_term, best first
+
+        Rank is the sum over the terms of log(1 + weight), ties broken by id.
+
+        Returns:
+            -tuple: (list of question ids for the requested slice, number of matches)
+        """
+        if self.postings is None:
+            self._load()
+        wanted = set(terms(search_term))
+        if not wanted:
+            return [], 0
+        with self.lock:
+            postings = sorted((self.postings.get(term, {}) for term in wanted), key=len)
+            matches = set(postings[0])
+            for posting in postings[1:]:
+                matches &= posting.keys()
+                if not matches:
+                    break
+            scored = sorted(matches, key=lambda question_id: (
+                -sum(math.log1p(posting[question_id]) for posting in postings), question_id))
+        end = None if limit is None else offset + limit
+        return scored[offset:end], len(scored)
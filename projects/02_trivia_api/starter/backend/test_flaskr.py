@@ -4,7 +4,8 @@ import json
 from flask_sqlalchemy import SQLAlchemy
 
 from flaskr import create_app
-from models import setup_db, Question, Category
+from flaskr.quiz import QuizSessions
+from models import setup_db, db, Question, Category, QuestionCounts, category_cache
 
 
 class TriviaTestCase(unittest.TestCase):
@@ -38,6 +39,23 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], True)
         self.assertTrue(data['categories'])
 
+    def test_category_cache_reloads_after_commit_only(self):
+        """Test case for a category write seen by the cache once committed"""
+        types_before = category_cache.types()
+        db.session.add(Category('Cooking'))
+        db.session.flush()
+        self.assertEqual(category_cache.types(), types_before)
+        db.session.rollback()
+        self.assertEqual(category_cache.types(), types_before)
+
+        category = Category('Cooking')
+        category.insert()
+        try:
+            self.assertEqual(category_cache.types(), types_before + ['Cooking'])
+        finally:
+            category.delete()
+        self.assertEqual(category_cache.types(), types_before)
+
     def test_get_paginated_questions(self):
         """Test case for retrieve paginated questions"""
         response = self.client().get('/questions')
@@ -60,18 +78,94 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['error'], 404)
         self.assertEqual(data['message'], 'Resource not found')
 
+    def test_paginate_questions_with_cursors(self):
+        """Test case for paging forward and back with next_cursor and prev_cursor"""
+        first = json.loads(self.client().get('/questions').data)
+        self.assertEqual(first['prev_cursor'], None)
+        self.assertTrue(first['next_cursor'])
+
+        response = self.client().get('/questions?cursor={}'.format(first['next_cursor']))
+        second = json.loads(response.data)
+        first_ids = [question['id'] for question in first['questions']]
+        second_ids = [question['id'] for question in second['questions']]
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(second_ids)
+        self.assertTrue(min(second_ids) > max(first_ids))
+        self.assertEqual(second_ids, sorted(second_ids))
+        self.assertTrue(second['prev_cursor'])
+
+        response = self.client().get('/questions?cursor={}'.format(second['prev_cursor']))
+        back = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([question['id'] for question in back['questions']], first_ids)
+        self.assertEqual(back['prev_cursor'], None)
+
+    def test_last_page_has_no_next_cursor(self):
+        """Test case for following next_cursor to the last page"""
+        data = json.loads(self.client().get('/questions').data)
+        seen = [question['id'] for question in data['questions']]
+        while data['next_cursor'] is not None and len(seen) <= data['total_questions']:
+            data = json.loads(self.client().get('/questions?cursor={}'.format(data['next_cursor'])).data)
+            seen += [question['id'] for question in data['questions']]
+
+        self.assertEqual(data['next_cursor'], None)
+        self.assertTrue(data['questions'])
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(len(seen), data['total_questions'])
+
+    def test_400_sent_with_malformed_cursor(self):
+        """Test case for a cursor that was not returned by the api"""
+        for response in [
+            self.client().get('/questions?cursor=not-a-cursor'),
+            self.client().get('/categories/6/questions?cursor=bm9wZQ=='),
+            self.client().post('search_questions?cursor=not-a-cursor', json={"searchTerm": "lake"}),
+            self.client().delete('/questions/1000?cursor=not-a-cursor'),
+        ]:
+            data = json.loads(response.data)
+
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(data['success'], False)
+            self.assertEqual(data['error'], 400)
+            self.assertEqual(data['message'], 'Bad request')
+
+    def total_questions(self, path):
+        return json.loads(self.client().get(path).data)['total_questions']
+
     def test_delete_question(self):
         """Test case to delete a question"""
         total_questions_before_delete = len(Question.query.all())
+        in_category_before_delete = self.total_questions('/categories/5/questions')
         response = self.client().delete('/questions/4')
         data = json.loads(response.data)
 
         self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.total_questions('/questions'), total_questions_before_delete - 1)
+        self.assertEqual(self.total_questions('/categories/5/questions'), in_category_before_delete - 1)
         self.assertEqual(data['success'], True)
         self.assertEqual(data['deleted'], 4)
         deleted_question = total_questions_before_delete - data['total_questions']
         self.assertEqual(deleted_question, 1)
 
+    def test_question_counts_reload_after_ttl(self):
+        """Test case for a question added by another process, counted once the counters expire"""
+        counts = QuestionCounts(ttl=60)
+        total_before = counts.total()
+        in_category_before = counts.category(3)
+        # written without Question.insert, as another worker or psql would
+        question = Question(question='added elsewhere', answer='answer', category='3', difficulty=1)
+        db.session.add(question)
+        db.session.commit()
+        try:
+            self.assertEqual(counts.total(), total_before)
+            counts.ttl = 0
+            self.assertEqual(counts.total(), total_before + 1)
+            self.assertEqual(counts.category(3), in_category_before + 1)
+        finally:
+            db.session.delete(question)
+            db.session.commit()
+
     def test_404_sent_deleting_non_existing_question(self):
         """Test case for deleting a non-existing question"""
         response = self.client().delete('/question/1000')
@@ -85,6 +179,7 @@ class TriviaTestCase(unittest.TestCase):
     def test_create_a_question(self):
         """Test case to create a new question"""
         total_questions_before_add = len(Question.query.all())
+        in_category_before_add = self.total_questions('/categories/3/questions')
         new_question = {
             "question": "adding a test question",
             "answer": "answer",
@@ -95,6 +190,8 @@ class TriviaTestCase(unittest.TestCase):
         data = json.loads(response.data)
 
         self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.total_questions('/questions'), total_questions_before_add + 1)
+        self.assertEqual(self.total_questions('/categories/3/questions'), in_category_before_add + 1)
         self.assertEqual(data['success'], True)
         self.assertTrue(data['question_id'])
         num_of_added_question = data['total_questions'] - total_questions_before_add
@@ -112,6 +209,37 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], True)
         self.assertTrue(data['questions'])
         self.assertTrue(data['total_questions'])
+        # the number of matches, not of every question
+        self.assertEqual(data['total_questions'], len(data['questions']))
+        self.assertTrue(data['total_questions'] < self.total_questions('/questions'))
+
+    def test_search_question_matches_answers(self):
+        """Test case for a search term found only in the answer of a question"""
+        response = self.client().post('search_questions', json={"searchTerm": "Maya Angelou"})
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([question['id'] for question in data['questions']], [5])
+        self.assertEqual(data['total_questions'], 1)
+
+    def test_search_question_ranks_question_matches_first(self):
+        """Test case for ranking a match in the question above a match in the answer"""
+        # the answer-only match is created first, so ordering by id would list it first
+        answer_match = json.loads(self.client().post('questions', json={
+            "question": "Which marsupial is known as the happiest animal?",
+            "answer": "The quokka", "category": "1", "difficulty": "1"}).data)
+        question_match = json.loads(self.client().post('questions', json={
+            "question": "On which island do most quokkas live?",
+            "answer": "Rottnest Island", "category": "3", "difficulty": "2"}).data)
+
+        response = self.client().post('search_questions', json={"searchTerm": "quokka"})
+        data = json.loads(response.data)
+        self.client().delete('/questions/{}'.format(answer_match['Question ID']))
+        self.client().delete('/questions/{}'.format(question_match['Question ID']))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([question['id'] for question in data['questions']],
+                         [question_match['Question ID'], answer_match['Question ID']])
 
     def test_retrieve_questions_by_category(self):
         """Test case for retrieve questions by category"""
@@ -123,6 +251,9 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data['questions'])
         self.assertTrue(data['total_questions'])
         self.assertTrue(data['current_category'] == 'Sports')
+        # the questions of the category, not of the whole table
+        self.assertEqual(data['total_questions'], len(Question.query.filter(Question.category == '6').all()))
+        self.assertTrue(data['total_questions'] < self.total_questions('/questions'))
 
     def test_retrieve_questions_out_of_category(self):
         """Test case for retrieve questions outside available categories"""
@@ -147,6 +278,65 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], True)
         self.assertTrue(data['question'])
 
+    def play_quiz(self, **body):
+        body.setdefault("quiz_category", {"type": "Sports", "id": "6"})
+        response = self.client().post('quizzes', json=body)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.data)
+
+    def sports_question_ids(self):
+        return sorted(question.id for question in Question.query.filter(Question.category == '6').all())
+
+    def test_play_quiz_deals_a_deck(self):
+        """Test case for the first question of a quiz, starting a quiz session"""
+        data = self.play_quiz(previous_questions=[])
+
+        self.assertEqual(data['success'], True)
+        self.assertTrue(data['quiz_session'])
+        self.assertIn(data['question']['id'], self.sports_question_ids())
+
+    def test_play_quiz_draws_without_repeats(self):
+        """Test case for playing a quiz session until its questions run out"""
+        data = self.play_quiz(previous_questions=[])
+        quiz_session = data['quiz_session']
+        drawn = []
+        while data['question'] is not None and len(drawn) <= len(self.sports_question_ids()):
+            drawn.append(data['question']['id'])
+            data = self.play_quiz(quiz_session=quiz_session)
+            self.assertEqual(data['quiz_session'], quiz_session)
+
+        self.assertEqual(sorted(drawn), self.sports_question_ids())
+
+    def test_play_quiz_exhausted_deck_returns_no_question(self):
+        """Test case for a quiz session whose questions have all been played"""
+        question_ids = self.sports_question_ids()
+        data = self.play_quiz(previous_questions=question_ids)
+
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['question'], None)
+
+        data = self.play_quiz(previous_questions=question_ids, quiz_session=data['quiz_session'])
+        self.assertEqual(data['question'], None)
+
+    def test_quiz_session_expires(self):
+        """Test case for a quiz session not used for longer than its ttl"""
+        quiz_sessions = QuizSessions(ttl=0)
+        quiz_session = quiz_sessions.create([10, 11])
+
+        self.assertNotIn(quiz_session, quiz_sessions)
+        with self.assertRaises(KeyError):
+            quiz_sessions.draw(quiz_session)
+
+    def test_play_quiz_unknown_session_falls_back_to_previous_questions(self):
+        """Test case for an unknown or expired quiz session"""
+        question_ids = self.sports_question_ids()
+        data = self.play_quiz(previous_questions=question_ids[1:], quiz_session='expired')
+
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['question']['id'], question_ids[0])
+        self.assertTrue(data['quiz_session'])
+        self.assertNotEqual(data['quiz_session'], 'expired')
+
 # Make the tests conveniently executable
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
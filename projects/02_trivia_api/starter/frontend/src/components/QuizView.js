@@ -10,6 +10,7 @@ class QuizView extends Component {
     super();
     this.state = {
         quizCategory: null,
+        quizSession: null,
         previousQuestions: [],
         showAnswer: false,
         categories: {},
@@ -55,8 +56,11 @@ class QuizView extends Component {
       dataType: "json",
       contentType: "application/json",
       data: JSON.stringify({
+        // Still sent with a quiz_session: when the session has expired or was
+        // dealt by another server process, the new deck leaves these out
         previous_questions: previousQuestions,
-        quiz_category: this.state.quizCategory
+        quiz_category: this.state.quizCategory,
+        quiz_session: this.state.quizSession
       }),
       xhrFields: {
         withCredentials: true
@@ -66,6 +70,7 @@ class QuizView extends Component {
         this.setState({
           showAnswer: false,
           previousQuestions: previousQuestions,
+          quizSession: result.quiz_session,
           currentQuestion: result.question,
           guess: "",
           forceEnd: result.question ? false : true
@@ -94,6 +99,7 @@ class QuizView extends Component {
   restartGame = () => {
     this.setState({
       quizCategory: null,
+      quizSession: null,
       previousQuestions: [],
       showAnswer: false,
       numCorrect: 0,